@@ -1,5 +1,5 @@
 from dotenv import load_dotenv
-import os, sys, requests, csv, datetime, json, re, time, urllib.parse
+import os, sys, requests, csv, datetime, json, re, time, urllib.parse, functools
 
 # Loop prompt for a path to the env file for API calls
 sScriptDir = os.path.dirname(os.path.abspath(__file__))
@@ -29,6 +29,18 @@ if not all([sZendeskSubdomain, sAgentEmail, sApiToken]):
     print("ZENDESK_API_TOKEN=<Your Token>")
     sys.exit(0)
 
+# Optional tuning, also read from credentials.env
+def envInt(sName, nDefault):
+    try:
+        return int((os.getenv(sName) or "").strip() or nDefault)
+    except ValueError:
+        print(f"Ignoring invalid {sName}, using {nDefault}.")
+        return nDefault
+
+nBatchSize = max(1, envInt("ZENMASTER_BATCH_SIZE", 100))
+nFilterSample = max(0, envInt("ZENMASTER_FILTER_SAMPLE", 16))
+bTableWorkbook = (os.getenv("ZENMASTER_WORKBOOK_LAYOUT") or "").strip().lower() == "table"
+
 # Build the base URL and authenticate once, used upon every call
 sZendeskBaseUrl = f"https://{sZendeskSubdomain}.zendesk.com"
 tBasicAuth      = (f"{sAgentEmail}/token", sApiToken)
@@ -126,13 +138,15 @@ def harvestTickets(sRoleLabel, sStartUrl):
         for dT in dJ.get("tickets", []):
             dT["_role"] = sRoleLabel # stamp the role (internal only)
             aTicketList.append(dT)
-            if len(aTicketList) >= 100:
+            if len(aTicketList) >= nBatchSize:
                 nTotalWritten += flushBatch()
         sPage = sNextLink(dJ)
     return
 
 def harvestSearch(sRoleLabel, sQuery):
     global aTicketList, nBatchIndex, nTotalWritten
+    if sPushdownQuery:
+        sQuery = sQuery + "+" + sPushdownQuery
     sEncoded = urllib.parse.quote(sQuery, safe=":+")
     sPage = f"{sZendeskBaseUrl}/api/v2/search.json?query={sEncoded}&per_page=100"
     while sPage:
@@ -140,8 +154,10 @@ def harvestSearch(sRoleLabel, sQuery):
         for dHit in dJ.get("results", []):
             if dHit.get("result_type") == "ticket":
                 dHit["_role"] = sRoleLabel # stamp the role (internal only)
+                if sPushdownQuery:
+                    dHit["_pushdown"] = True # server already applied the pushed-down atoms
                 aTicketList.append(dHit)
-                if len(aTicketList) >= 100:
+                if len(aTicketList) >= nBatchSize:
                     nTotalWritten += flushBatch()
         sPage = sNextLink(dJ)
     return
@@ -312,40 +328,172 @@ def compileExpr(sInput, fValidator, sErr, bLower=False):
         print("Invalid expression. Use values with AND/OR and parentheses.")
         return None
 
-def evalRpn(aRpn, fMatch):
+# ---------------- Normalized ticket view ----------------
+# Built once per ticket by the compiled proposition and shared by all of its atoms, so each
+# field is normalized at most once per ticket, on first use.
+class TicketView:
+    __slots__ = ("dT", "dLower", "dSeconds")
+
+    def __init__(self, dT):
+        self.dT = dT
+        self.dLower = {}
+        self.dSeconds = {}
+
+    def lower(self, sField):
+        s = self.dLower.get(sField)
+        if s is None:
+            s = self.dLower[sField] = str(self.dT.get(sField) or "").lower()
+        return s
+
+    def seconds(self, sField):
+        # ISO timestamp as epoch seconds, or None when it is missing or malformed
+        if sField not in self.dSeconds:
+            v = self.dT.get(sField)
+            self.dSeconds[sField] = isoSeconds(v) if isinstance(v, str) else None
+        return self.dSeconds[sField]
+
+# ---------------- Proposition compiler ----------------
+# Each atom carries "src": (sValue, sTest), Python source that computes v from dT once and
+# tests it. The whole proposition becomes one generated function, so filtering a ticket runs
+# no RPN interpreter and creates no closures, and each atom carries "stats": [evaluations,
+# matches, seconds] from sampled tickets that decide which commuting atoms run first.
+def rpnToSource(aRpn, sLeaf):
+    # sLeaf is the test of one expression value, written with {tok} in its place
     aStack = []
     for t in aRpn:
         if isinstance(t, tuple) and t[0] == "VAL":
-            aStack.append(bool(fMatch(t[1])))
-        elif t == "AND":
-            if len(aStack) < 2:
-                return False
-            b2 = aStack.pop(); b1 = aStack.pop()
-            aStack.append(b1 and b2)
-        elif t == "OR":
-            if len(aStack) < 2:
-                return False
-            b2 = aStack.pop(); b1 = aStack.pop()
-            aStack.append(b1 or b2)
+            aStack.append("(" + sLeaf.replace("{tok}", repr(t[1])) + ")")
+        elif t in ("AND", "OR") and len(aStack) >= 2:
+            s2 = aStack.pop(); s1 = aStack.pop()
+            aStack.append(f"({s1} {t.lower()} {s2})")
         else:
-            return False
-    return aStack[-1] if aStack else False
+            return "False"
+    return aStack[-1] if aStack else "False"
+
+# Contains-expressions scan v once: all their terms become one regex alternation, longest first
+aPatternSets = [] # matchers the generated source refers to by index
+
+def containsSrc(sValue, aRpn):
+    aToks = sorted({t[1] for t in aRpn if isinstance(t, tuple) and t[0] == "VAL"}, key=len, reverse=True)
+    if len(aToks) < 2:
+        return sValue, rpnToSource(aRpn, "{tok} in v")
+    sAlt = "|".join(re.escape(s) for s in aToks)
+    n = len(aPatternSets)
+    if "AND" not in aRpn:
+        # A plain OR of terms holds as soon as any one of them occurs
+        aPatternSets.append(re.compile(sAlt))
+        return sValue, f"aPatternSets[{n}].search(v) is not None"
+    # With AND every term's presence matters. The lookahead reports the longest term starting at each
+    # position, and any shorter term starting there is a prefix of it, so it is found through dSubs.
+    aPatternSets.append((re.compile(f"(?=({sAlt}))"), {u: [t for t in aToks if t in u] for u in aToks}))
+    return f"patternHits({n}, {sValue})", rpnToSource(aRpn, "{tok} in v")
+
+def patternHits(n, sText):
+    oRe, dSubs = aPatternSets[n]
+    return {t for u in set(oRe.findall(sText)) for t in dSubs[u]}
+
+def propositionTree(aUse):
+    # The left-to-right fold as an AST of atom indexes; a run of one operator flattens into a
+    # single node whose children commute, the only place evaluation order is free to change
+    oTree = 0
+    for i in range(1, len(aUse)):
+        sOp = aUse[i]["op"]
+        if isinstance(oTree, tuple) and oTree[0] == sOp:
+            oTree[1].append(i)
+        else:
+            oTree = (sOp, [oTree, i])
+    return oTree
+
+def atomEstimate(tAtom):
+    # Mean seconds per ticket and smoothed match rate from the sampled counters
+    nEvals, nTrue, fSeconds = tAtom["stats"]
+    return (fSeconds / nEvals if nEvals else 0.0), (nTrue + 1) / (nEvals + 2)
+
+def orderTree(oTree, aUse):
+    # Returns (tree, cost, p). AND children run by cost / P(false) and OR children by cost / P(true),
+    # the order with the least expected work; unmeasured atoms keep the order they were entered in.
+    if not isinstance(oTree, tuple):
+        fCost, fP = atomEstimate(aUse[oTree])
+        return oTree, fCost, fP
+    sOp, aKids = oTree
+    aRanked = [orderTree(oKid, aUse) for oKid in aKids]
+    if sOp == "AND":
+        aRanked.sort(key=lambda t: t[1] / max(1 - t[2], 1e-9))
+    else:
+        aRanked.sort(key=lambda t: t[1] / max(t[2], 1e-9))
+    fCost, fReach = 0.0, 1.0
+    for _, fKidCost, fKidP in aRanked:
+        fCost += fReach * fKidCost
+        fReach *= fKidP if sOp == "AND" else 1 - fKidP
+    return (sOp, [t[0] for t in aRanked]), fCost, (fReach if sOp == "AND" else 1 - fReach)
+
+def emitTree(oTree, aUse, sIndent, aLines):
+    # Leaves set b; every later child of a node runs only while b can still change
+    if not isinstance(oTree, tuple):
+        sValue, sTest = aUse[oTree]["src"]
+        aLines.append(f"{sIndent}v = {sValue}")
+        aLines.append(f"{sIndent}b = bool({sTest})")
+        return
+    sOp, aKids = oTree
+    emitTree(aKids[0], aUse, sIndent, aLines)
+    for oKid in aKids[1:]:
+        aLines.append(sIndent + ("if b:" if sOp == "AND" else "if not b:"))
+        emitTree(oKid, aUse, sIndent + "    ", aLines)
+
+def compileProposition(aUse, oTree):
+    aLines = ["def fMatch(dT):"]
+    if any("oV." in tAtom["src"][0] for tAtom in aUse):
+        aLines.append("    oV = TicketView(dT)")
+    if aUse:
+        emitTree(oTree, aUse, "    ", aLines)
+        aLines.append("    return b")
+    else:
+        aLines.append("    return True")
+    dLocal = {}
+    exec("\n".join(aLines), globals(), dLocal)
+    return dLocal["fMatch"]
 
 # ---------------- Filtering application ----------------
+dFilterFns = {"batches": 0, "stable": 0} # plus "all" / "residual" -> compiled proposition, set once the filters are final
+
+def compileFilters():
+    # Called once the filters are final and again after sampling; True when the order changed
+    aTrees = [orderTree(propositionTree(aUse), aUse)[0] if aUse else None for aUse in (aAtoms, aResidualAtoms)]
+    if dFilterFns.get("trees") == aTrees:
+        return False
+    dFilterFns["trees"] = aTrees
+    dFilterFns["all"] = compileProposition(aAtoms, aTrees[0])
+    dFilterFns["residual"] = compileProposition(aResidualAtoms, aTrees[1])
+    return True
+
+def profileAtoms(aSample):
+    # Times each atom alone on the first tickets of a batch; the counters halve past a window
+    # so the order follows the data as it drifts
+    for tAtom in aAtoms:
+        if "fn" not in tAtom:
+            tAtom["fn"] = compileProposition([tAtom], 0)
+        fAtom = tAtom["fn"]
+        fStart = time.perf_counter()
+        nTrue = sum(1 for dT in aSample if fAtom(dT))
+        aStats = tAtom["stats"]
+        aStats[0] += len(aSample)
+        aStats[1] += nTrue
+        aStats[2] += time.perf_counter() - fStart
+        if aStats[0] > 4096:
+            tAtom["stats"] = [aStats[0] // 2, aStats[1] // 2, aStats[2] / 2]
+    dFilterFns["stable"] = 0 if compileFilters() else dFilterFns["stable"] + 1
+
 def applyFilters(aTickets):
     if not aAtoms:
         return aTickets
-    aOut = []
-    for dT in aTickets:
-        bOk = aAtoms[0]["pred"](dT)
-        for tAtom in aAtoms[1:]:
-            if tAtom["op"] == "AND":
-                bOk = bOk and tAtom["pred"](dT)
-            else:
-                bOk = bOk or tAtom["pred"](dT)
-        if bOk:
-            aOut.append(dT)
-    return aOut
+    # Sampling runs every atom without short-circuit, so it stops once the order has held for
+    # three sampled batches and then only checks for drift every 32nd batch
+    dFilterFns["batches"] += 1
+    if nFilterSample and (dFilterFns["stable"] < 3 or dFilterFns["batches"] % 32 == 0):
+        profileAtoms(aTickets[:nFilterSample])
+    fAll, fResidual = dFilterFns["all"], dFilterFns["residual"]
+    # Tickets from a pushed-down search already passed the server-side atoms
+    return [dT for dT in aTickets if (fResidual if dT.get("_pushdown") else fAll)(dT)]
 
 def formatProposition():
     if not aAtoms:
@@ -355,6 +503,67 @@ def formatProposition():
         sOut += " " + tAtom["op"] + " " + tAtom["desc"]
     return sOut
 
+# ---------------- Server-side filter pushdown ----------------
+# An atom may carry "query": (aTerms, bExact), Zendesk search terms matching a superset of
+# what its predicate accepts (exactly the same tickets when bExact).
+aResidualAtoms = []
+sPushdownQuery = ""
+
+def rpnSingleValue(aRpn):
+    if len(aRpn) == 1 and isinstance(aRpn[0], tuple) and aRpn[0][0] == "VAL":
+        return aRpn[0][1]
+    return None
+
+def dateRangeTerms(sField, sStart, sEnd):
+    return [f"{sField}>={sStart}T00:00:00Z", f"{sField}<={sEnd}T23:59:59Z"]
+
+# ---------------- Fast timestamp parsing ----------------
+# Fixed-offset slicing instead of splitting and comparing text, memoized since timestamps repeat
+# across roles. Seconds rather than minutes, because the time range filters take HH:MM:SS.
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+@functools.lru_cache(maxsize=65536)
+def isoSeconds(sVal):
+    # "YYYY-MM-DDTHH:MM:SS..." to seconds since 1970-01-01 (naive); None when malformed
+    try:
+        if sVal[4] != "-" or sVal[7] != "-" or sVal[10] != "T" or sVal[13] != ":" or sVal[16] != ":":
+            return None
+        nHour, nMinute, nSecond = int(sVal[11:13]), int(sVal[14:16]), int(sVal[17:19])
+        if not (0 <= nHour < 24 and 0 <= nMinute < 60 and 0 <= nSecond < 61):
+            return None
+        nDay = datetime.date(int(sVal[0:4]), int(sVal[5:7]), int(sVal[8:10])).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError, IndexError):
+        return None
+    return nDay * 86400 + nHour * 3600 + nMinute * 60 + nSecond
+
+def isoRangeSrc(sField, bTimeOfDay, sStart, sEnd):
+    # Atom source for a YYYY-MM-DD day range, or an HH:MM:SSZ time of day range, as integer bounds
+    if bTimeOfDay:
+        nStart, nEnd = (int(s[0:2]) * 3600 + int(s[3:5]) * 60 + int(s[6:8]) for s in (sStart, sEnd))
+        return (f"oV.seconds({sField!r})", f"v is not None and {nStart} <= v % 86400 <= {nEnd}")
+    nStart, nEnd = ((datetime.date.fromisoformat(s).toordinal() - EPOCH_ORDINAL) * 86400 for s in (sStart, sEnd))
+    return (f"oV.seconds({sField!r})", f"v is not None and {nStart} <= v <= {nEnd + 86399}")
+
+def planPushdown():
+    # Only atoms every match must satisfy can narrow the search: aAtoms folds left to right,
+    # so that is the AND chain after the last OR, or every atom when there is no OR.
+    nLastOr = -1
+    for i, tAtom in enumerate(aAtoms):
+        if tAtom["op"] == "OR":
+            nLastOr = i
+    aTerms = []
+    aResidual = []
+    for i, tAtom in enumerate(aAtoms):
+        tQuery = tAtom.get("query")
+        if i > nLastOr and tQuery is not None:
+            for sTerm in tQuery[0]:
+                if sTerm not in aTerms:
+                    aTerms.append(sTerm)
+            if tQuery[1]:
+                continue
+        aResidual.append(tAtom)
+    return "+".join(aTerms), aResidual
+
 def promptTimeRange():
     while True:
         sStart = input("Start time (HH:MM:SSZ): ").strip()
@@ -393,7 +602,7 @@ def choosePropositionMergeMode(nCount):
             return sMode
         print("Invalid choice. Enter a, o, or k.")
 
-def addAtomWithMerge(sWhat, sDesc, fPred):
+def addAtomWithMerge(sWhat, sDesc, tSrc, tQuery=None):
     global aAtoms
     if aAtoms:
         sMode = choosePropositionMergeMode(len(aAtoms))
@@ -403,14 +612,14 @@ def addAtomWithMerge(sWhat, sDesc, fPred):
             return
         if sMode == "o":
             aAtoms = []
-            aAtoms.append({"op": None, "desc": sDesc, "pred": fPred})
+            aAtoms.append({"op": None, "desc": sDesc, "src": tSrc, "query": tQuery, "stats": [0, 0, 0.0]})
             print("Filter set/updated.")
             print("Proposition: " + formatProposition())
             return
         sOp = chooseExprLogicOnce(sWhat)
-        aAtoms.append({"op": sOp, "desc": sDesc, "pred": fPred})
+        aAtoms.append({"op": sOp, "desc": sDesc, "src": tSrc, "query": tQuery, "stats": [0, 0, 0.0]})
     else:
-        aAtoms.append({"op": None, "desc": sDesc, "pred": fPred})
+        aAtoms.append({"op": None, "desc": sDesc, "src": tSrc, "query": tQuery, "stats": [0, 0, 0.0]})
     print("Filter set/updated.")
     print("Proposition: " + formatProposition())
 
@@ -419,38 +628,26 @@ def mergeExpr(aList, tExpr, sWhat, sFieldKey):
         return
     aList.append(tExpr)
     sExpr, aRpn = tExpr
-    if sFieldKey == "org":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: str(dT.get("organization_id")) == v)
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "recipient":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: str(dT.get("recipient") or "").lower() == v)
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "requester":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: str(dT.get("requester_id")) == v)
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "result_type":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: str(dT.get("result_type") or "").lower() == v)
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "status":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: str(dT.get("status") or "").lower() == v)
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "subject":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: v in str(dT.get("subject") or "").lower())
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "description":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: v in str(dT.get("description") or "").lower())
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
-    elif sFieldKey == "submitter":
-        def fPred(dT, a=aRpn):
-            return evalRpn(a, lambda v: str(dT.get("submitter_id")) == v)
-        addAtomWithMerge(sWhat, "(" + sExpr + ")", fPred)
+    # Single-value equality atoms map one-to-one onto a Zendesk search keyword
+    dKeywords = {"org": "organization", "recipient": "recipient", "requester": "requester",
+                 "status": "status", "submitter": "submitter"}
+    sSingle = rpnSingleValue(aRpn)
+    tQuery = ([f"{dKeywords[sFieldKey]}:{sSingle}"], True) if sFieldKey in dKeywords and sSingle else None
+    # Source for each field's value, and the test of one expression value against it
+    dFieldSrc = {
+        "org":         ('str(dT.get("organization_id"))',          "v == {tok}"),
+        "recipient":   ('oV.lower("recipient")',                    "v == {tok}"),
+        "requester":   ('str(dT.get("requester_id"))',             "v == {tok}"),
+        "result_type": ('oV.lower("result_type")',                  "v == {tok}"),
+        "status":      ('oV.lower("status")',                       "v == {tok}"),
+        "subject":     ('oV.lower("subject")',                      "{tok} in v"),
+        "description": ('oV.lower("description")',                  "{tok} in v"),
+        "submitter":   ('str(dT.get("submitter_id"))',             "v == {tok}"),
+    }
+    if sFieldKey in dFieldSrc:
+        sValue, sLeaf = dFieldSrc[sFieldKey]
+        tSrc = containsSrc(sValue, aRpn) if sLeaf == "{tok} in v" else (sValue, rpnToSource(aRpn, sLeaf))
+        addAtomWithMerge(sWhat, "(" + sExpr + ")", tSrc, tQuery)
 
 aAtoms = []
 
@@ -514,58 +711,22 @@ while True:
         mergeExpr(aDescriptionExprs, tExpr, "Description filter", "description")
     elif sChoice == "9":
         sStart, sEnd = promptDateRange()
-        def fPred(dT, a=(sStart, sEnd)):
-            sCreated = dT.get("created_at")
-            if not isinstance(sCreated, str) or "T" not in sCreated:
-                return False
-            sDate = sCreated.split("T")[0]
-            return a[0] <= sDate <= a[1]
-        addAtomWithMerge("Created_at date range filter", f'(created_at_date between "{sStart}" and "{sEnd}")', fPred)
+        addAtomWithMerge("Created_at date range filter", f'(created_at_date between "{sStart}" and "{sEnd}")', isoRangeSrc("created_at", False, sStart, sEnd), (dateRangeTerms("created", sStart, sEnd), True))
     elif sChoice == "10":
         sStart, sEnd = promptTimeRange()
-        def fPred(dT, a=(sStart, sEnd)):
-            sCreated = dT.get("created_at")
-            if not isinstance(sCreated, str) or "T" not in sCreated:
-                return False
-            sTime = sCreated.split("T")[1]
-            return a[0] <= sTime <= a[1]
-        addAtomWithMerge("Created_at time range filter", f'(created_at_time between "{sStart}" and "{sEnd}")', fPred)
+        addAtomWithMerge("Created_at time range filter", f'(created_at_time between "{sStart}" and "{sEnd}")', isoRangeSrc("created_at", True, sStart, sEnd))
     elif sChoice == "11":
         sStart, sEnd = promptDateRange()
-        def fPred(dT, a=(sStart, sEnd)):
-            sUpdated = dT.get("updated_at")
-            if not isinstance(sUpdated, str) or "T" not in sUpdated:
-                return False
-            sDate = sUpdated.split("T")[0]
-            return a[0] <= sDate <= a[1]
-        addAtomWithMerge("Updated_at date range filter", f'(updated_at_date between "{sStart}" and "{sEnd}")', fPred)
+        addAtomWithMerge("Updated_at date range filter", f'(updated_at_date between "{sStart}" and "{sEnd}")', isoRangeSrc("updated_at", False, sStart, sEnd), (dateRangeTerms("updated", sStart, sEnd), True))
     elif sChoice == "12":
         sStart, sEnd = promptTimeRange()
-        def fPred(dT, a=(sStart, sEnd)):
-            sUpdated = dT.get("updated_at")
-            if not isinstance(sUpdated, str) or "T" not in sUpdated:
-                return False
-            sTime = sUpdated.split("T")[1]
-            return a[0] <= sTime <= a[1]
-        addAtomWithMerge("Updated_at time range filter", f'(updated_at_time between "{sStart}" and "{sEnd}")', fPred)
+        addAtomWithMerge("Updated_at time range filter", f'(updated_at_time between "{sStart}" and "{sEnd}")', isoRangeSrc("updated_at", True, sStart, sEnd))
     elif sChoice == "13":
         sStart, sEnd = promptDateRange()
-        def fPred(dT, a=(sStart, sEnd)):
-            sDue = dT.get("due_at")
-            if not isinstance(sDue, str) or "T" not in sDue:
-                return False
-            sDate = sDue.split("T")[0]
-            return a[0] <= sDate <= a[1]
-        addAtomWithMerge("Due_at date range filter", f'(due_at_date between "{sStart}" and "{sEnd}")', fPred)
+        addAtomWithMerge("Due_at date range filter", f'(due_at_date between "{sStart}" and "{sEnd}")', isoRangeSrc("due_at", False, sStart, sEnd))
     elif sChoice == "14":
         sStart, sEnd = promptTimeRange()
-        def fPred(dT, a=(sStart, sEnd)):
-            sDue = dT.get("due_at")
-            if not isinstance(sDue, str) or "T" not in sDue:
-                return False
-            sTime = sDue.split("T")[1]
-            return a[0] <= sTime <= a[1]
-        addAtomWithMerge("Due_at time range filter", f'(due_at_time between "{sStart}" and "{sEnd}")', fPred)
+        addAtomWithMerge("Due_at time range filter", f'(due_at_time between "{sStart}" and "{sEnd}")', isoRangeSrc("due_at", True, sStart, sEnd))
     elif sChoice == "15":
         print("Proposition: " + formatProposition())
     elif sChoice == "16":
@@ -606,7 +767,9 @@ def writeBatchFiles(aTickets, nBatchIdx, bWantWorkbook):
         for dT in aTicketsSorted:
             oCsvWriter.writerow({k: cellValue(dT.get(k)) for k in aColumnNames})
     sWorkbookName = None
-    if bWantWorkbook:
+    if bWantWorkbook and bTableWorkbook:
+        writeTableRows(aTicketsSorted, aColumnNames)
+    elif bWantWorkbook:
         try:
             import xlsxwriter
         except ImportError:
@@ -656,12 +819,63 @@ def writeBatchFiles(aTickets, nBatchIdx, bWantWorkbook):
     print(f"Wrote ticket-variable file -> {sEnvFileName}")
     return len(aTicketsSorted)
 
+# ZENMASTER_WORKBOOK_LAYOUT=table: one workbook per run instead of one per batch. The first batch
+# fixes the columns, every ticket is then one plain row, and the header gets an autofilter at the end.
+# A new workbook starts only when Excel's row limit is reached.
+EXCEL_MAX_ROWS = 1048576
+dTableWb = {"wb": None, "count": 0, "columns": None, "missing": False}
+
+def openTableWorkbook():
+    try:
+        import xlsxwriter
+    except ImportError:
+        print("xlsxwriter not installed, skipping workbook.")
+        dTableWb["missing"] = True
+        return
+    dTableWb["count"] += 1
+    dTableWb["name"] = f"zendesk_tickets_{sFileStamp}_table_{dTableWb['count']:02d}.xlsx"
+    dTableWb["wb"] = xlsxwriter.Workbook(dTableWb["name"], {"constant_memory": True})
+    dTableWb["ws"] = dTableWb["wb"].add_worksheet("tickets")
+    oFmtHead = dTableWb["wb"].add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+    dTableWb["ws"].set_column(0, len(dTableWb["columns"])-1, 30)
+    dTableWb["ws"].write_row(0, 0, dTableWb["columns"], oFmtHead)
+    dTableWb["ws"].freeze_panes(1, 0)
+    dTableWb["row"] = 1
+
+def writeTableRows(aTicketsSorted, aColumnNames):
+    if dTableWb["missing"]:
+        return
+    if dTableWb["columns"] is None:
+        dTableWb["columns"] = list(aColumnNames)
+        dTableWb["dropped"] = set()
+    setNew = set(aColumnNames) - set(dTableWb["columns"]) - dTableWb["dropped"]
+    if setNew:
+        print(f"Table workbook has no column for {', '.join(sorted(setNew))}; those values are only in the batch CSV.")
+        dTableWb["dropped"] |= setNew
+    for dT in aTicketsSorted:
+        if dTableWb["wb"] is not None and dTableWb["row"] >= EXCEL_MAX_ROWS:
+            closeTableWorkbook()
+        if dTableWb["wb"] is None:
+            openTableWorkbook()
+            if dTableWb["wb"] is None:
+                return
+        dTableWb["ws"].write_row(dTableWb["row"], 0, [cellValue(dT.get(k)) for k in dTableWb["columns"]])
+        dTableWb["row"] += 1
+
+def closeTableWorkbook():
+    if dTableWb["wb"] is None:
+        return
+    dTableWb["ws"].autofilter(0, 0, dTableWb["row"]-1, len(dTableWb["columns"])-1)
+    dTableWb["wb"].close()
+    dTableWb["wb"] = None
+    print(f"Wrote {dTableWb['row']-1} tickets to table workbook -> {dTableWb['name']}")
+
 def flushBatch():
     global aTicketList, nBatchIndex, bMakeWorkbook
     if not aTicketList:
         return 0
-    aBatch = aTicketList[:100]
-    aTicketList = aTicketList[100:]
+    aBatch = aTicketList[:nBatchSize]
+    aTicketList = aTicketList[nBatchSize:]
     aFiltered = applyFilters(aBatch)
     if not aFiltered:
         nBatchIndex += 1
@@ -677,11 +891,20 @@ bMakeWorkbook = input("Save formatted Excel workbook? (y/n): ").strip().lower()
 nBatchIndex = 1
 nTotalWritten = 0
 
-harvestTickets("assigned",  f"{sZendeskBaseUrl}/api/v2/tickets.json?page[size]=100")
-harvestSearch("cc",        f"type:ticket+cc:{nMyId}")
-harvestSearch("follower",  f"type:ticket+follower:{nMyId}")
-harvestSearch("requester", f"type:ticket+requester:{nMyId}")
-
-nTotalWritten += flushBatch()
+# The tickets.json walk has no query, so only the role searches are narrowed on the server
+sPushdownQuery, aResidualAtoms = planPushdown()
+if sPushdownQuery:
+    print("Server-side search terms: " + sPushdownQuery.replace("+", " "))
+compileFilters()
+
+try:
+    harvestTickets("assigned",  f"{sZendeskBaseUrl}/api/v2/tickets.json?page[size]=100")
+    harvestSearch("cc",        f"type:ticket+cc:{nMyId}")
+    harvestSearch("follower",  f"type:ticket+follower:{nMyId}")
+    harvestSearch("requester", f"type:ticket+requester:{nMyId}")
+    nTotalWritten += flushBatch()
+finally:
+    # Also on sys.exit or Ctrl-C, so the rows already written stay readable
+    closeTableWorkbook()
 
 print(f"Total tickets written across batches: {nTotalWritten}")
\ No newline at end of file
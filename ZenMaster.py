@@ -1,7 +1,25 @@
 from dotenv import load_dotenv
-import os, sys, requests, csv, datetime, json, re, time, urllib.parse
+import argparse
+import os, sys, requests, csv, datetime, json, re, time, urllib.parse, threading, asyncio, hashlib, codecs, queue, gzip, io, sqlite3, mmap, functools, shutil, tempfile, atexit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from zoneinfo import ZoneInfo
 
+oArgParser = argparse.ArgumentParser(description="Export the Zendesk tickets you are assigned to, cc'd on, following or requested.")
+oArgParser.add_argument("--resume", action="store_true", help="continue the interrupted run recorded in zenmaster_checkpoint.json")
+oArgParser.add_argument("--from-store", action="store_true", help="filter and export the tickets in zenmaster_store.sqlite instead of harvesting")
+oArgParser.add_argument("--record", metavar="DIR", help="save every API page to DIR for later --replay")
+oArgParser.add_argument("--replay", metavar="DIR", help="run against the pages saved by --record DIR, offline and without credentials")
+oArgs = oArgParser.parse_args()
+if oArgs.resume and oArgs.from_store:
+    oArgParser.error("--resume and --from-store cannot be combined")
+if oArgs.record and oArgs.replay:
+    oArgParser.error("--record and --replay cannot be combined")
+
+# State kept beside credentials.env between runs. --record snapshots them into DIR/state before
+# the run, and --replay runs on a scratch copy of that snapshot, so the recording is never touched.
+STATE_FILES = ("name_cache.json", "zenmaster_checkpoint.json", "zenmaster_checkpoint.seen", "incremental_cursor.json")
+
 # Loop prompt for a path to the env file for API calls
 sScriptDir = os.path.dirname(os.path.abspath(__file__))
 sCredsPath = None
@@ -10,7 +28,39 @@ for sName in os.listdir(sScriptDir):
         sCredsPath = os.path.join(sScriptDir, sName)
         break
 
-if not sCredsPath or not os.path.isfile(sCredsPath):
+if oArgs.replay:
+    # A replay needs no credentials: the subdomain comes from the recording, and the run's state
+    # files start as the recording's did. A credentials.env here still supplies the ZENMASTER_* tuning.
+    if sCredsPath and os.path.isfile(sCredsPath):
+        load_dotenv(dotenv_path=sCredsPath, override=True)
+    try:
+        with open(os.path.join(oArgs.replay, "recording.json"), "r", encoding="utf-8") as hIn:
+            dRecording = json.load(hIn)
+    except (OSError, ValueError):
+        print(f"{oArgs.replay} is not a recording made with --record.")
+        sys.exit(1)
+    sZendeskSubdomain = dRecording.get("subdomain")
+    sAgentEmail       = dRecording.get("email", "")
+    sApiToken         = ""
+    # The recorded pages continue the recording's checkpoint, or do not
+    oArgs.resume      = bool(dRecording.get("resume")) and not oArgs.from_store
+    sScratchDir = tempfile.mkdtemp(prefix="zenmaster_replay_")
+    atexit.register(shutil.rmtree, sScratchDir, True)
+    sStateDir = os.path.join(oArgs.replay, "state")
+    for sName in STATE_FILES:
+        if os.path.isfile(os.path.join(sStateDir, sName)):
+            shutil.copy2(os.path.join(sStateDir, sName), sScratchDir)
+    sCredsPath        = os.path.join(sScratchDir, "credentials.env")
+elif oArgs.from_store:
+    # Nothing is fetched, so no credentials are needed; a credentials.env still supplies the
+    # subdomain for the name cache and the ZENMASTER_* tuning
+    sCredsPath = sCredsPath or os.path.join(sScriptDir, "credentials.env")
+    if os.path.isfile(sCredsPath):
+        load_dotenv(dotenv_path=sCredsPath, override=True)
+    sZendeskSubdomain = os.getenv("ZENDESK_SUBDOMAIN")
+    sAgentEmail       = os.getenv("ZENDESK_EMAIL", "")
+    sApiToken         = ""
+elif not sCredsPath or not os.path.isfile(sCredsPath):
     print("Missing credentials.env in this folder. Create a file named credentials.env here with the following contents:")
     print("")
     print("ZENDESK_SUBDOMAIN=<Your Subdomain>")
@@ -18,17 +68,81 @@ if not sCredsPath or not os.path.isfile(sCredsPath):
     print("ZENDESK_API_TOKEN=<Your Token>")
     sys.exit(0)
 
-load_dotenv(dotenv_path=sCredsPath, override=True)
-sZendeskSubdomain = os.getenv("ZENDESK_SUBDOMAIN")
-sAgentEmail       = os.getenv("ZENDESK_EMAIL")
-sApiToken         = os.getenv("ZENDESK_API_TOKEN")
-if not all([sZendeskSubdomain, sAgentEmail, sApiToken]):
-    print("Incomplete .env file...")
-    print("")
-    print("ZENDESK_SUBDOMAIN=<Your Subdomain>")
-    print("ZENDESK_EMAIL=<Your Email>")
-    print("ZENDESK_API_TOKEN=<Your Token>")
-    sys.exit(0)
+if not (oArgs.replay or oArgs.from_store):
+    load_dotenv(dotenv_path=sCredsPath, override=True)
+    sZendeskSubdomain = os.getenv("ZENDESK_SUBDOMAIN")
+    sAgentEmail       = os.getenv("ZENDESK_EMAIL")
+    sApiToken         = os.getenv("ZENDESK_API_TOKEN")
+    if not all([sZendeskSubdomain, sAgentEmail, sApiToken]):
+        print("Incomplete .env file...")
+        print("")
+        print("ZENDESK_SUBDOMAIN=<Your Subdomain>")
+        print("ZENDESK_EMAIL=<Your Email>")
+        print("ZENDESK_API_TOKEN=<Your Token>")
+        sys.exit(0)
+
+if oArgs.record:
+    # The run keeps its usual state files; the recording gets a copy of them as they were before it
+    sStateDir = os.path.join(oArgs.record, "state")
+    os.makedirs(sStateDir, exist_ok=True)
+    for sName in STATE_FILES:
+        sSrc, sDst = os.path.join(os.path.dirname(sCredsPath), sName), os.path.join(sStateDir, sName)
+        if os.path.isfile(sSrc):
+            shutil.copy2(sSrc, sDst)
+        elif os.path.exists(sDst):
+            os.remove(sDst) # left by an earlier recording into the same folder
+    with open(os.path.join(oArgs.record, "recording.json"), "w", encoding="utf-8") as hOut:
+        json.dump({
+            "subdomain": sZendeskSubdomain,
+            "email": sAgentEmail,
+            "resume": oArgs.resume,
+            "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }, hOut)
+
+# Optional tuning, also read from credentials.env (defaults keep the sequential behaviour)
+def envInt(sName, nDefault):
+    try:
+        return int((os.getenv(sName) or "").strip() or nDefault)
+    except ValueError:
+        print(f"Ignoring invalid {sName}, using {nDefault}.")
+        return nDefault
+
+def envFlag(sName, bDefault=False):
+    sVal = (os.getenv(sName) or "").strip().lower()
+    if not sVal:
+        return bDefault
+    return sVal in ("1", "y", "yes", "true", "on")
+
+nHarvestWorkers = max(1, envInt("ZENMASTER_HARVEST_WORKERS", 1))
+nRateReserve    = max(0, envInt("ZENMASTER_RATE_RESERVE", 5))
+bIncremental    = envFlag("ZENMASTER_INCREMENTAL")
+sIncrementalStart = (os.getenv("ZENMASTER_INCREMENTAL_START") or "").strip()
+bSearchExport   = envFlag("ZENMASTER_SEARCH_EXPORT")
+bAsyncEngine    = envFlag("ZENMASTER_ASYNC")
+nAsyncInFlight  = max(1, envInt("ZENMASTER_ASYNC_INFLIGHT", 8)) # one page per role at most, see the asyncio engine
+bStreamJson     = envFlag("ZENMASTER_STREAM_JSON")
+bHttpCache      = envFlag("ZENMASTER_HTTP_CACHE") and not (oArgs.record or oArgs.replay)
+nCacheTtl       = max(0, envInt("ZENMASTER_CACHE_TTL", 300))
+nCacheMaxMb     = max(1, envInt("ZENMASTER_CACHE_MAX_MB", 200))
+bResolveNames   = envFlag("ZENMASTER_RESOLVE_NAMES")
+bDedup          = envFlag("ZENMASTER_DEDUP") # adds a Roles column, so it is opt-in
+nNameCacheTtl   = max(0, envInt("ZENMASTER_NAME_CACHE_TTL", 86400)) if not (oArgs.replay or oArgs.from_store) else float("inf")
+nNameCacheSize  = max(100, envInt("ZENMASTER_NAME_CACHE_SIZE", 20000))
+# Name lookups are network calls, so they only run in the pipeline's filter stage, never under oBatchLock
+bPipeline       = envFlag("ZENMASTER_PIPELINE") or bResolveNames
+nBatchSize      = max(1, envInt("ZENMASTER_BATCH_SIZE", 50))
+nRotateRows     = max(1, envInt("ZENMASTER_ROTATE_ROWS", 100000))
+nRotateMb       = max(1, envInt("ZENMASTER_ROTATE_MB", 256))
+bParquet        = envFlag("ZENMASTER_PARQUET")
+nParquetRowGroup = max(1, envInt("ZENMASTER_PARQUET_ROW_GROUP", 10000))
+bTableWorkbook  = (os.getenv("ZENMASTER_WORKBOOK_LAYOUT") or "").strip().lower() == "table"
+sArchiveMode    = (os.getenv("ZENMASTER_ARCHIVE") or "").strip().lower()
+bStore          = envFlag("ZENMASTER_STORE") and not oArgs.from_store
+if sArchiveMode not in ("", "gzip", "zstd"):
+    print("Ignoring invalid ZENMASTER_ARCHIVE, expected gzip or zstd.")
+    sArchiveMode = ""
+nQueueDepth     = max(1, envInt("ZENMASTER_QUEUE_DEPTH", 4))
+nFilterSample   = max(0, envInt("ZENMASTER_FILTER_SAMPLE", 16))
 
 # Build the base URL and authenticate once, used upon every call
 sZendeskBaseUrl = f"https://{sZendeskSubdomain}.zendesk.com"
@@ -36,15 +150,203 @@ tBasicAuth      = (f"{sAgentEmail}/token", sApiToken)
 
 oHttp = requests.Session()
 oHttp.auth = tBasicAuth
-oHttp.headers.update({"User-Agent": "ZenMaster/1.0", "Accept": "application/json"})
+dDefaultHeaders = {"User-Agent": "ZenMaster/1.0", "Accept": "application/json"}
+oHttp.headers.update(dDefaultHeaders)
+oHttp.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max(10, nHarvestWorkers)))
 nDefaultTimeout = 30
 
-def httpGetJson(sUrl, nMaxRetries=6):
+# Token bucket shared by every worker, synced from Zendesk's rate-limit headers.
+# Capacity is the per-minute limit, refilled at limit/60 per second; nRateReserve
+# requests are kept back for other integrations using the same account.
+dRate = {"nLimit": 0, "fRefill": 0.0, "fTokens": float("inf"), "fLast": time.monotonic(),
+         "fResumeAt": 0.0, "fThrottled": 0.0, "nThrottles": 0}
+oRateLock = threading.Lock()
+
+def headerInt(dHeaders, aNames):
+    for sName in aNames:
+        sVal = dHeaders.get(sName)
+        if sVal is None:
+            continue
+        try:
+            return int(float(sVal))
+        except ValueError:
+            continue
+    return None
+
+def rateReserve():
+    # Returns how long the caller must wait before sending its request
+    with oRateLock:
+        fNow = time.monotonic()
+        fWait = max(0.0, dRate["fResumeAt"] - fNow)
+        if dRate["fRefill"] > 0:
+            dRate["fTokens"] = min(dRate["nLimit"], dRate["fTokens"] + (fNow - dRate["fLast"]) * dRate["fRefill"])
+            dRate["fLast"] = fNow
+            dRate["fTokens"] -= 1 # reserve our slot; a negative balance queues callers behind each other
+            if dRate["fTokens"] < 0:
+                fWait = max(fWait, -dRate["fTokens"] / dRate["fRefill"])
+        if fWait > 0:
+            dRate["fThrottled"] += fWait
+            dRate["nThrottles"] += 1
+    return fWait
+
+def rateAcquire():
+    fWait = rateReserve()
+    if fWait > 0:
+        time.sleep(fWait)
+
+def rateObserve(dHeaders):
+    nLimit     = headerInt(dHeaders, ("X-Rate-Limit", "ratelimit-limit"))
+    nRemaining = headerInt(dHeaders, ("X-Rate-Limit-Remaining", "ratelimit-remaining"))
+    nReset     = headerInt(dHeaders, ("ratelimit-reset",))
+    if nLimit is None and nRemaining is None:
+        return
+    with oRateLock:
+        fNow = time.monotonic()
+        if nLimit:
+            dRate["nLimit"] = nLimit
+            dRate["fRefill"] = nLimit / 60.0
+            dRate["fTokens"] = min(dRate["fTokens"], nLimit)
+            dRate["fLast"] = fNow
+        if nRemaining is not None:
+            # The server's count is authoritative, never assume more than it reports
+            dRate["fTokens"] = min(dRate["fTokens"], nRemaining - nRateReserve)
+            if nRemaining <= nRateReserve and nReset:
+                dRate["fResumeAt"] = max(dRate["fResumeAt"], fNow + nReset)
+
+def ratePause(nSeconds):
+    with oRateLock:
+        dRate["fResumeAt"] = max(dRate["fResumeAt"], time.monotonic() + nSeconds)
+        dRate["fTokens"] = min(dRate["fTokens"], 0.0)
+
+# ---------------- Response cache ----------------
+# One JSON file per URL (and agent), holding the validators and the parsed body. The file
+# mtime is the last time Zendesk confirmed the body; within nCacheTtl it is served without
+# asking, after that it is revalidated with If-None-Match / If-Modified-Since.
+sCacheDir = os.path.join(sScriptDir, ".zenmaster_cache")
+oCacheLock = threading.Lock()
+dCacheUsage = {"nBytes": None}
+
+def cachePath(sUrl):
+    sKey = hashlib.sha256(f"{sAgentEmail} {sUrl}".encode("utf-8")).hexdigest()
+    return os.path.join(sCacheDir, sKey + ".json")
+
+def cacheLoad(sUrl):
+    sPath = cachePath(sUrl)
+    try:
+        fAge = time.time() - os.path.getmtime(sPath)
+        with open(sPath, "r", encoding="utf-8") as hIn:
+            dEntry = json.load(hIn)
+    except (OSError, ValueError):
+        return None
+    if dEntry.get("url") != sUrl:
+        return None
+    dEntry["fresh"] = fAge < nCacheTtl
+    return dEntry
+
+def cacheConditionalHeaders(dEntry):
+    dHeaders = {}
+    if dEntry and dEntry.get("etag"):
+        dHeaders["If-None-Match"] = dEntry["etag"]
+    if dEntry and dEntry.get("last_modified"):
+        dHeaders["If-Modified-Since"] = dEntry["last_modified"]
+    return dHeaders
+
+def cacheTouch(sUrl):
+    try:
+        os.utime(cachePath(sUrl))
+    except OSError:
+        pass
+
+def cacheStore(sUrl, dHeaders, dBody):
+    sEtag = dHeaders.get("ETag")
+    sLastModified = dHeaders.get("Last-Modified")
+    sPath = cachePath(sUrl)
+    sTmpPath = f"{sPath}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(sCacheDir, exist_ok=True)
+        with open(sTmpPath, "w", encoding="utf-8") as hOut:
+            json.dump({"url": sUrl, "etag": sEtag, "last_modified": sLastModified, "body": dBody}, hOut, ensure_ascii=False)
+        nOld = os.path.getsize(sPath) if os.path.exists(sPath) else 0
+        os.replace(sTmpPath, sPath)
+        nNew = os.path.getsize(sPath)
+    except OSError as e:
+        print(f"Could not write response cache entry: {e}")
+        return
+    with oCacheLock:
+        if dCacheUsage["nBytes"] is None or dCacheUsage["nBytes"] + nNew - nOld > nCacheMaxMb * 1024 * 1024:
+            cacheEvict() # also takes the first measurement of the directory
+        else:
+            dCacheUsage["nBytes"] += nNew - nOld
+
+def cacheEvict():
+    # Oldest-confirmed first, down to 90% of the limit; caller holds oCacheLock
+    aEntries = []
+    for sName in os.listdir(sCacheDir):
+        sPath = os.path.join(sCacheDir, sName)
+        try:
+            aEntries.append((os.path.getmtime(sPath), os.path.getsize(sPath), sPath))
+        except OSError:
+            continue
+    aEntries.sort()
+    nBytes = sum(e[1] for e in aEntries)
+    nTarget = int(nCacheMaxMb * 1024 * 1024 * 0.9)
+    for fMtime, nSize, sPath in aEntries:
+        if nBytes <= nTarget:
+            break
+        try:
+            os.remove(sPath)
+            nBytes -= nSize
+        except OSError:
+            pass
+    dCacheUsage["nBytes"] = nBytes
+
+# ---------------- Record / replay ----------------
+# --record keeps every page body as received, one file per URL; --replay memory-maps them back for
+# the streaming parser (ZENMASTER_STREAM_JSON) and reads them whole otherwise.
+sRecordingDir = oArgs.record or oArgs.replay
+
+def recordingPath(sUrl):
+    return os.path.join(sRecordingDir, hashlib.sha256(sUrl.encode("utf-8")).hexdigest() + ".json")
+
+def recordPage(sUrl, bBody):
+    sPath = recordingPath(sUrl)
+    with open(sPath + ".tmp", "wb") as hOut:
+        hOut.write(bBody)
+    os.replace(sPath + ".tmp", sPath)
+
+def openRecorded(sUrl):
+    try:
+        hIn = open(recordingPath(sUrl), "rb")
+    except OSError:
+        print(f"{sUrl} is not in the recording; record again with the same settings and filters.")
+        sys.exit(1)
+    if os.fstat(hIn.fileno()).st_size == 0:
+        hIn.close()
+        print(f"Empty response recorded for {sUrl}; record again.")
+        sys.exit(1)
+    return hIn
+
+def replayPage(sUrl):
+    with openRecorded(sUrl) as hIn:
+        return mmap.mmap(hIn.fileno(), 0, access=mmap.ACCESS_READ)
+
+def replayJson(sUrl):
+    with openRecorded(sUrl) as hIn:
+        bBody = hIn.read()
+    try:
+        return json.loads(bBody)
+    except ValueError:
+        print(f"Invalid JSON recorded for {sUrl}.")
+        sys.exit(1)
+
+def httpGet(sUrl, nMaxRetries=6, dHeaders=None, bStream=False):
+    # Returns the first successful (or 304) response; retries and exits exactly as httpGetJson always has
     nTry = 0
     while True:
         nTry += 1
+        rateAcquire()
         try:
-            oResp = oHttp.get(sUrl, timeout=nDefaultTimeout)
+            oResp = oHttp.get(sUrl, timeout=nDefaultTimeout, headers=dHeaders, stream=bStream)
         except requests.RequestException as e:
             if nTry >= nMaxRetries:
                 print(f"Network error contacting Zendesk: {e}")
@@ -54,20 +356,23 @@ def httpGetJson(sUrl, nMaxRetries=6):
             continue
 
         nStatus = oResp.status_code
+        rateObserve(oResp.headers)
 
         if nStatus == 429:
+            oResp.close()
             sRetryAfter = oResp.headers.get("Retry-After", "2")
             try:
                 nSleep = max(1, int(float(sRetryAfter)))
             except Exception:
                 nSleep = 2
-            time.sleep(nSleep)
+            ratePause(nSleep) # every worker backs off, not just this one
             if nTry >= nMaxRetries:
                 print("Rate limited by Zendesk too many times (429).")
                 sys.exit(1)
             continue
 
         if 500 <= nStatus < 600:
+            oResp.close()
             if nTry >= nMaxRetries:
                 print(f"Zendesk server error {nStatus}.")
                 sys.exit(1)
@@ -95,11 +400,152 @@ def httpGetJson(sUrl, nMaxRetries=6):
                 pass
             sys.exit(1)
 
+        return oResp
+
+def httpGetJson(sUrl, nMaxRetries=6):
+    if oArgs.replay:
+        return replayJson(sUrl)
+    dCached = cacheLoad(sUrl) if bHttpCache else None
+    if dCached and dCached["fresh"]:
+        return dCached["body"]
+    oResp = httpGet(sUrl, nMaxRetries, cacheConditionalHeaders(dCached))
+    if oResp.status_code == 304 and dCached:
+        cacheTouch(sUrl)
+        return dCached["body"]
+    try:
+        dBody = oResp.json()
+    except ValueError:
+        print("Invalid JSON received from Zendesk.")
+        sys.exit(1)
+    if bHttpCache:
+        cacheStore(sUrl, oResp.headers, dBody)
+    if oArgs.record:
+        recordPage(sUrl, oResp.content)
+    return dBody
+
+# ---------------- Streaming pages ----------------
+# Parses a top-level JSON object as the bytes arrive: elements of the array under sArrayKey
+# are yielded one at a time, every other top-level key is collected into dMeta.
+oJsonDecoder = json.JSONDecoder()
+reJsonWs = re.compile(r"[ \t\n\r]*")
+
+def iterJsonArrayItems(aChunks, sArrayKey, dMeta):
+    oUtf8 = codecs.getincrementaldecoder("utf-8")()
+    itChunks = iter(aChunks)
+    sBuf = ""
+    nPos = 0
+    bEof = False
+
+    def fill():
+        # Drops the consumed prefix and appends the next chunk; False once the body is exhausted
+        nonlocal sBuf, nPos, bEof
+        if bEof:
+            return False
+        bChunk = next(itChunks, None)
+        if bChunk is None:
+            bEof = True
+            sBuf = sBuf[nPos:] + oUtf8.decode(b"", final=True)
+        else:
+            sBuf = sBuf[nPos:] + oUtf8.decode(bChunk)
+        nPos = 0
+        return True
+
+    def peek():
+        nonlocal nPos
+        while True:
+            nPos = reJsonWs.match(sBuf, nPos).end()
+            if nPos < len(sBuf):
+                return sBuf[nPos]
+            if not fill():
+                raise ValueError("Truncated JSON page from Zendesk.")
+
+    def readChar(sAllowed):
+        nonlocal nPos
+        c = peek()
+        if c not in sAllowed:
+            raise ValueError("Invalid JSON page from Zendesk.")
+        nPos += 1
+        return c
+
+    def readValue():
+        nonlocal nPos
+        while True:
+            peek()
+            try:
+                vVal, nEnd = oJsonDecoder.raw_decode(sBuf, nPos)
+            except json.JSONDecodeError:
+                nEnd = None
+            # A value touching the end of the buffer may be a cut-off number or literal
+            if nEnd is not None and (nEnd < len(sBuf) or bEof):
+                nPos = nEnd
+                return vVal
+            if not fill():
+                raise ValueError("Invalid JSON page from Zendesk.")
+
+    readChar("{")
+    if peek() == "}":
+        return
+    while True:
+        sKey = readValue()
+        readChar(":")
+        if sKey == sArrayKey and peek() == "[":
+            nPos += 1
+            if peek() == "]":
+                nPos += 1
+            else:
+                while True:
+                    yield readValue()
+                    if readChar(",]") == "]":
+                        break
+        else:
+            dMeta[sKey] = readValue()
+        if readChar(",}") == "}":
+            return
+
+def iterPageItems(sUrl, sArrayKey, dMeta, nMaxRetries=6):
+    # Yields the page's sArrayKey elements; the rest of the page (links, meta, cursors) lands in dMeta
+    if oArgs.replay and bStreamJson:
+        oMap = replayPage(sUrl)
         try:
-            return oResp.json()
-        except ValueError:
-            print("Invalid JSON received from Zendesk.")
+            yield from iterJsonArrayItems((oMap[i:i+65536] for i in range(0, len(oMap), 65536)), sArrayKey, dMeta)
+        except ValueError as e:
+            print(f"Could not read recorded page {sUrl}: {e}")
             sys.exit(1)
+        finally:
+            oMap.close()
+        return
+    if not bStreamJson or bHttpCache:
+        dJ = httpGetJson(sUrl, nMaxRetries)
+        dMeta.update({k: v for k, v in dJ.items() if k != sArrayKey})
+        yield from (dJ.get(sArrayKey) or [])
+        return
+    nYielded = 0
+    nTry = 0
+    while True:
+        nTry += 1
+        oResp = httpGet(sUrl, nMaxRetries, bStream=True)
+        dMeta.clear()
+        nSeen = 0
+        aBody = []
+        try:
+            itChunks = oResp.iter_content(chunk_size=65536)
+            if oArgs.record:
+                itChunks = (aBody.append(bChunk) or bChunk for bChunk in itChunks)
+            for vItem in iterJsonArrayItems(itChunks, sArrayKey, dMeta):
+                nSeen += 1
+                if nSeen > nYielded: # a re-read page skips what was already handed out
+                    nYielded += 1
+                    yield vItem
+            if oArgs.record:
+                recordPage(sUrl, b"".join(aBody))
+            return
+        except (requests.RequestException, ValueError) as e:
+            if nTry >= nMaxRetries:
+                print(f"Could not read page from Zendesk: {e}")
+                sys.exit(1)
+            time.sleep(min(2 ** (nTry - 1), 30))
+        finally:
+            oResp.close()
 
 def sNextLink(dJ):
     sL = None
@@ -109,14 +555,20 @@ def sNextLink(dJ):
         sL = None
     if not sL:
         sL = dJ.get("next_page")
+    # Cursor pagination can still carry a links.next on its last page
+    if sL and isinstance(dJ.get("meta"), dict) and dJ["meta"].get("has_more") is False:
+        sL = None
     return sL
 
-dMe = httpGetJson(f"{sZendeskBaseUrl}/api/v2/users/me.json")
-if not isinstance(dMe, dict) or "user" not in dMe or "id" not in dMe["user"]:
-    print("Unexpected response from /users/me.json")
-    print(json.dumps(dMe, ensure_ascii=False))
-    sys.exit(1)
-nMyId = dMe["user"]["id"]
+if oArgs.from_store:
+    nMyId = None # the role searches never run
+else:
+    dMe = httpGetJson(f"{sZendeskBaseUrl}/api/v2/users/me.json")
+    if not isinstance(dMe, dict) or "user" not in dMe or "id" not in dMe["user"]:
+        print("Unexpected response from /users/me.json")
+        print(json.dumps(dMe, ensure_ascii=False))
+        sys.exit(1)
+    nMyId = dMe["user"]["id"]
 
 def minutesOfDay(oDt):
     return oDt.hour * 60 + oDt.minute
@@ -305,25 +757,6 @@ def toRpn(aTokens):
         aOut.append(op)
     return aOut
 
-def evalRpn(aRpn, fMatch):
-    aStack = []
-    for t in aRpn:
-        if isinstance(t, tuple) and t[0] == "VAL":
-            aStack.append(bool(fMatch(t[1])))
-        elif t == "AND":
-            if len(aStack) < 2:
-                return False
-            b2 = aStack.pop(); b1 = aStack.pop()
-            aStack.append(b1 and b2)
-        elif t == "OR":
-            if len(aStack) < 2:
-                return False
-            b2 = aStack.pop(); b1 = aStack.pop()
-            aStack.append(b1 or b2)
-        else:
-            return False
-    return aStack[-1] if aStack else False
-
 def choosePropositionMergeMode(nCount):
     while True:
         sMode = input(f"There is an existing filter. Choose: (a) add, (o) overwrite, (k) keep: ").strip().lower()
@@ -333,20 +766,106 @@ def choosePropositionMergeMode(nCount):
 
 aAtoms = []
 
+# ---------------- Proposition compiler ----------------
+# The whole proposition becomes one generated function with the predicates bound as a default
+# argument, so filtering a ticket walks no atom list and skips the predicates that cannot change b.
+# Each atom carries "stats": [evaluations, matches, seconds] from sampled tickets, which decide
+# which commuting atoms run first.
+def propositionTree(aUse):
+    # The left-to-right fold as an AST of atom indexes; a run of one operator flattens into a
+    # single node whose children commute, the only place evaluation order is free to change
+    oTree = 0
+    for i in range(1, len(aUse)):
+        sOp = aUse[i]["op"]
+        if isinstance(oTree, tuple) and oTree[0] == sOp:
+            oTree[1].append(i)
+        else:
+            oTree = (sOp, [oTree, i])
+    return oTree
+
+def atomEstimate(tAtom):
+    # Mean seconds per ticket and smoothed match rate from the sampled counters
+    nEvals, nTrue, fSeconds = tAtom["stats"]
+    return (fSeconds / nEvals if nEvals else 0.0), (nTrue + 1) / (nEvals + 2)
+
+def orderTree(oTree, aUse):
+    # Returns (tree, cost, p). AND children run by cost / P(false) and OR children by cost / P(true),
+    # the order with the least expected work; unmeasured atoms keep the order they were entered in.
+    if not isinstance(oTree, tuple):
+        fCost, fP = atomEstimate(aUse[oTree])
+        return oTree, fCost, fP
+    sOp, aKids = oTree
+    aRanked = [orderTree(oKid, aUse) for oKid in aKids]
+    if sOp == "AND":
+        aRanked.sort(key=lambda t: t[1] / max(1 - t[2], 1e-9))
+    else:
+        aRanked.sort(key=lambda t: t[1] / max(t[2], 1e-9))
+    fCost, fReach = 0.0, 1.0
+    for _, fKidCost, fKidP in aRanked:
+        fCost += fReach * fKidCost
+        fReach *= fKidP if sOp == "AND" else 1 - fKidP
+    return (sOp, [t[0] for t in aRanked]), fCost, (fReach if sOp == "AND" else 1 - fReach)
+
+def emitTree(oTree, aUse, sIndent, aLines):
+    # Leaves set b; every later child of a node runs only while b can still change
+    if not isinstance(oTree, tuple):
+        aLines.append(f"{sIndent}b = bool(aPreds[{oTree}](dT))")
+        return
+    sOp, aKids = oTree
+    emitTree(aKids[0], aUse, sIndent, aLines)
+    for oKid in aKids[1:]:
+        aLines.append(sIndent + ("if b:" if sOp == "AND" else "if not b:"))
+        emitTree(oKid, aUse, sIndent + "    ", aLines)
+
+def compileProposition(aUse, oTree):
+    aLines = ["def fMatch(dT, aPreds=aPreds):"]
+    if aUse:
+        emitTree(oTree, aUse, "    ", aLines)
+        aLines.append("    return b")
+    else:
+        aLines.append("    return True")
+    dLocal = {}
+    exec("\n".join(aLines), {"aPreds": [tAtom["pred"] for tAtom in aUse]}, dLocal)
+    return dLocal["fMatch"]
+
+dFilterFns = {"batches": 0, "stable": 0} # plus "all" / "residual" -> compiled proposition, set once the filters are final
+
+def compileFilters():
+    # Called once the filters are final and again after sampling; True when the order changed
+    aTrees = [orderTree(propositionTree(aUse), aUse)[0] if aUse else None for aUse in (aAtoms, aResidualAtoms)]
+    if dFilterFns.get("trees") == aTrees:
+        return False
+    dFilterFns["trees"] = aTrees
+    dFilterFns["all"] = compileProposition(aAtoms, aTrees[0])
+    dFilterFns["residual"] = compileProposition(aResidualAtoms, aTrees[1])
+    return True
+
+def profileAtoms(aSample):
+    # Times each atom alone on the first tickets of a batch; the counters halve past a window
+    # so the order follows the data as it drifts
+    for tAtom in aAtoms:
+        fAtom = tAtom["pred"]
+        fStart = time.perf_counter()
+        nTrue = sum(1 for dT in aSample if fAtom(dT))
+        aStats = tAtom["stats"]
+        aStats[0] += len(aSample)
+        aStats[1] += nTrue
+        aStats[2] += time.perf_counter() - fStart
+        if aStats[0] > 4096:
+            tAtom["stats"] = [aStats[0] // 2, aStats[1] // 2, aStats[2] / 2]
+    dFilterFns["stable"] = 0 if compileFilters() else dFilterFns["stable"] + 1
+
 def applyFilters(aTickets):
     if not aAtoms:
         return aTickets
-    aOut = []
-    for dT in aTickets:
-        bOk = aAtoms[0]["pred"](dT)
-        for tAtom in aAtoms[1:]:
-            if tAtom["op"] == "AND":
-                bOk = bOk and tAtom["pred"](dT)
-            else:
-                bOk = bOk or tAtom["pred"](dT)
-        if bOk:
-            aOut.append(dT)
-    return aOut
+    # Sampling runs every atom without short-circuit, so it stops once the order has held for
+    # three sampled batches and then only checks for drift every 32nd batch
+    dFilterFns["batches"] += 1
+    if nFilterSample and (dFilterFns["stable"] < 3 or dFilterFns["batches"] % 32 == 0):
+        profileAtoms(aTickets[:nFilterSample])
+    fAll, fResidual = dFilterFns["all"], dFilterFns["residual"]
+    # Tickets from a pushed-down search already passed the server-side atoms
+    return [dT for dT in aTickets if (fResidual if dT.get("_pushdown") else fAll)(dT)]
 
 def formatProposition():
     if not aAtoms:
@@ -356,13 +875,95 @@ def formatProposition():
         sOut += " " + tAtom["op"] + " " + tAtom["desc"]
     return sOut
 
-def dtFromString_Ymd12h(sVal):
+# ---------------- Server-side filter pushdown ----------------
+# An atom may carry "query": (aTerms, bExact), Zendesk search terms matching a superset of
+# what its predicate accepts (exactly the same tickets when bExact).
+aResidualAtoms = []
+sPushdownQuery = ""
+
+def rpnSingleValue(aRpn):
+    if len(aRpn) == 1 and isinstance(aRpn[0], tuple) and aRpn[0][0] == "VAL":
+        return aRpn[0][1]
+    return None
+
+def dateRangeTerms(sField, sStart, sEnd):
+    return [f"{sField}>={sStart}T00:00:00Z", f"{sField}<={sEnd}T23:59:59Z"]
+
+def planPushdown():
+    # Only atoms every match must satisfy can narrow the search: aAtoms folds left to right,
+    # so that is the AND chain after the last OR, or every atom when there is no OR.
+    nLastOr = -1
+    for i, tAtom in enumerate(aAtoms):
+        if tAtom["op"] == "OR":
+            nLastOr = i
+    aTerms = []
+    aResidual = []
+    for i, tAtom in enumerate(aAtoms):
+        tQuery = tAtom.get("query")
+        if i > nLastOr and tQuery is not None:
+            for sTerm in tQuery[0]:
+                if sTerm not in aTerms:
+                    aTerms.append(sTerm)
+            if tQuery[1]:
+                continue
+        aResidual.append(tAtom)
+    return "+".join(aTerms), aResidual
+
+# ---------------- Fast timestamp parsing ----------------
+# Fixed-offset slicing instead of strptime, memoized since timestamps repeat across roles and
+# batches. Times become integer minutes since 1970-01-01 (naive, like the strings), so range
+# checks are integer comparisons.
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+EPOCH = datetime.datetime(1970, 1, 1)
+
+@functools.lru_cache(maxsize=65536)
+def isoMinutes(sVal):
+    # "YYYY-MM-DDTHH:MM..." as Zendesk sends created_at/updated_at/due_at; None when malformed
     try:
-        return datetime.datetime.strptime(sVal, "%Y/%m/%d %I:%M %p")
-    except Exception:
+        if sVal[4] != "-" or sVal[7] != "-" or sVal[10] != "T" or sVal[13] != ":":
+            return None
+        nHour, nMinute = int(sVal[11:13]), int(sVal[14:16])
+        if not (0 <= nHour < 24 and 0 <= nMinute < 60):
+            return None
+        nDay = datetime.date(int(sVal[0:4]), int(sVal[5:7]), int(sVal[8:10])).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError, IndexError):
+        return None
+    return nDay * 1440 + nHour * 60 + nMinute
+
+@functools.lru_cache(maxsize=65536)
+def ymd12hMinutes(sVal):
+    # "YYYY/MM/DD HH:MM AM/PM" by fixed offsets; strptime only for an odd unpadded value
+    try:
+        if len(sVal) == 19 and sVal[4] == "/" and sVal[7] == "/" and sVal[10] == " " and sVal[13] == ":" and sVal[16] == " ":
+            nHour, nMinute, sHalf = int(sVal[11:13]), int(sVal[14:16]), sVal[17:].upper()
+            if not (1 <= nHour <= 12 and 0 <= nMinute < 60 and sHalf in ("AM", "PM")):
+                return None
+            oDate = datetime.date(int(sVal[0:4]), int(sVal[5:7]), int(sVal[8:10]))
+            nHour = nHour % 12 + (12 if sHalf == "PM" else 0)
+        else:
+            oDt = datetime.datetime.strptime(sVal, "%Y/%m/%d %I:%M %p")
+            oDate, nHour, nMinute = oDt.date(), oDt.hour, oDt.minute
+    except (TypeError, ValueError):
         return None
+    return (oDate.toordinal() - EPOCH_ORDINAL) * 1440 + nHour * 60 + nMinute
+
+def dtFromString_Ymd12h(sVal):
+    nMinutes = ymd12hMinutes(sVal) if isinstance(sVal, str) else None
+    return None if nMinutes is None else EPOCH + datetime.timedelta(minutes=nMinutes)
+
+def dayMinutes(sDate):
+    # First minute of a YYYY-MM-DD day
+    return (datetime.date.fromisoformat(sDate).toordinal() - EPOCH_ORDINAL) * 1440
+
+def createdMinutes(dT):
+    # created_at parsed once per ticket and kept on the record for every date/time atom
+    nMinutes = dT._created_min
+    if nMinutes is False:
+        sCreated = dT.created_at
+        nMinutes = dT._created_min = isoMinutes(sCreated) if isinstance(sCreated, str) else None
+    return nMinutes
 
-def addAtom_OR(sDesc, fPred):
+def addAtom_OR(sDesc, fPred, tQuery=None):
     global aAtoms
     if aAtoms:
         sMode = choosePropositionMergeMode(len(aAtoms))
@@ -372,13 +973,13 @@ def addAtom_OR(sDesc, fPred):
             return
         if sMode == "o":
             aAtoms = []
-            aAtoms.append({"op": None, "desc": sDesc, "pred": fPred})
+            aAtoms.append({"op": None, "desc": sDesc, "pred": fPred, "query": tQuery, "stats": [0, 0, 0.0]})
             print("Date/Time filter set.")
             print("Proposition: " + formatProposition())
             return
-        aAtoms.append({"op": "OR", "desc": sDesc, "pred": fPred})
+        aAtoms.append({"op": "OR", "desc": sDesc, "pred": fPred, "query": tQuery, "stats": [0, 0, 0.0]})
     else:
-        aAtoms.append({"op": None, "desc": sDesc, "pred": fPred})
+        aAtoms.append({"op": None, "desc": sDesc, "pred": fPred, "query": tQuery, "stats": [0, 0, 0.0]})
     print("Date/Time filter set.")
     print("Proposition: " + formatProposition())
 
@@ -397,41 +998,33 @@ def setDateTimeFilter():
     sTimeExpr = input("> ").strip()
     aShifts, sErr = parseTimeExpr(sTimeExpr)
     if sTimeExpr=="" and sDateExpr=="":
-        addAtom_OR("(all tickets)", lambda dT: True)
+        addAtom_OR("(all tickets)", lambda dT: True, ([], True))
         return
     if sErr:
         print(sErr)
         if not aDateRanges:
             return
         aShifts = None
-    def predDate(dT, a=aDateRanges):
+    def predDate(dT, a=[(dayMinutes(s0), dayMinutes(s1) + 1439) for (s0, s1) in aDateRanges]):
         if not a:
             return True
-        sCreated = dT.get("created_at")
-        if not isinstance(sCreated, str) or "T" not in sCreated:
+        nCreated = createdMinutes(dT)
+        if nCreated is None:
             return False
-        sDate = sCreated.split("T")[0]
-        for (s0, s1) in a:
-            if s0 <= sDate <= s1:
+        for (n0, n1) in a:
+            if n0 <= nCreated <= n1:
                 return True
         return False
-    def predTime(dT, aSh=aShifts):
-        if not aSh:
+    def predTime(dT, aWin=[w for sh in (aShifts or []) for w in shiftToWindows(sh)], bAny=bool(aShifts)):
+        if not bAny:
             return True
-        sCreated = dT.get("created_at")
-        if not isinstance(sCreated, str) or "T" not in sCreated:
+        nCreated = createdMinutes(dT)
+        if nCreated is None:
             return False
-        sTime = sCreated.split("T")[1]
-        try:
-            h, m, rest = sTime.split(":")
-            sec = rest[:2]
-            nMin = int(h)*60 + int(m)
-        except Exception:
-            return False
-        for sh in aSh:
-            for (st, en, wrap) in shiftToWindows(sh):
-                if inWindow(nMin, st, en, wrap):
-                    return True
+        nMin = nCreated % 1440
+        for (st, en, wrap) in aWin:
+            if inWindow(nMin, st, en, wrap):
+                return True
         return False
     def fPred(dT):
         return predDate(dT) and predTime(dT)
@@ -443,7 +1036,12 @@ def setDateTimeFilter():
     if not sDescParts:
         sDescParts.append("(all tickets)")
     sDesc = " AND ".join(sDescParts)
-    addAtom_OR(sDesc, fPred)
+    tQuery = None
+    if aDateRanges:
+        # Several ranges are sent as their envelope; the shift part never leaves the client
+        aTerms = dateRangeTerms("created", min(a[0] for a in aDateRanges), max(a[1] for a in aDateRanges))
+        tQuery = (aTerms, len(aDateRanges) == 1 and not aShifts)
+    addAtom_OR(sDesc, fPred, tQuery)
 
 FIELD_IDS = [
     900012377866, 900012444286, 14398053308057, 900013268543, 900013268523,
@@ -559,17 +1157,154 @@ STD_FIELD_GETTERS = {
     "Type": lambda dT: dT.get("type"),
     "Description": lambda dT: dT.get("description"),
     "Tags": lambda dT: ",".join([str(t) for t in (dT.get("tags") or [])]),
-    "Ticket Type": lambda dT: dT.get("type")
+    "Ticket Type": lambda dT: dT.get("type"),
+    "Organization Name": lambda dT: nameLookup("organizations", dT.get("organization_id")),
+    "Assignee Name": lambda dT: nameLookup("users", dT.get("assignee_id")),
+    "Group Name": lambda dT: nameLookup("groups", dT.get("group_id")),
+    "Roles": lambda dT: ",".join(dT.get("_roles") or [dT.get("_role", "unknown")])
 }
 
-def customVal(dT, nId):
-    try:
-        for cf in dT.get("custom_fields", []):
-            if int(cf.get("id") or 0) == int(nId):
-                return cf.get("value")
-    except Exception:
+# Name columns follow their id column when ZENMASTER_RESOLVE_NAMES is on
+NAME_COLUMNS = {"Organization": "Organization Name", "Assignee": "Assignee Name", "Group": "Group Name"}
+aOutputHeaders = []
+for sHeader in CSV_HEADERS:
+    aOutputHeaders.append(sHeader)
+    if bResolveNames and sHeader in NAME_COLUMNS:
+        aOutputHeaders.append(NAME_COLUMNS[sHeader])
+if bDedup:
+    aOutputHeaders.append("Roles")
+
+# ---------------- Compact ticket records ----------------
+# Ingest projects each API ticket into one of these and drops the dict, keeping only what the
+# filters and the output columns read. get()/[] keep the dict-style call sites working.
+setCustomFieldIds = set(FIELD_IDS)
+
+class TicketRecord:
+    __slots__ = ("id", "organization_id", "assignee_id", "group_id", "status", "subject", "type",
+                 "description", "tags", "created_at", "updated_at", "custom_fields", "custom_ids",
+                 "_role", "_roles", "_pushdown", "_created_min")
+
+    def __init__(self, dT, sRoleLabel, bPushdown=False):
+        self.id = dT.get("id")
+        self.organization_id = dT.get("organization_id")
+        self.assignee_id = dT.get("assignee_id")
+        self.group_id = dT.get("group_id")
+        self.status = dT.get("status")
+        self.subject = dT.get("subject")
+        self.type = dT.get("type")
+        self.description = dT.get("description")
+        self.tags = tuple(dT.get("tags") or ())
+        self.created_at = dT.get("created_at")
+        self.updated_at = dT.get("updated_at")
+        # id -> value for the exported custom fields only; custom_ids keeps the full id list column
+        self.custom_fields = {}
+        aIds = []
+        for cf in (dT.get("custom_fields") or []):
+            nId = cf.get("id")
+            aIds.append(str(nId))
+            if nId in setCustomFieldIds:
+                self.custom_fields[nId] = cf.get("value")
+        self.custom_ids = ",".join(aIds)
+        self._role = sRoleLabel
+        self._roles = None
+        self._pushdown = bPushdown
+        self._created_min = False # not parsed yet; createdMinutes fills it on the first date/time test
+
+    def get(self, sKey, vDefault=None):
+        v = getattr(self, sKey, None)
+        return vDefault if v is None else v
+
+    def __getitem__(self, sKey):
+        return getattr(self, sKey)
+
+    def __setitem__(self, sKey, v):
+        setattr(self, sKey, v)
+
+# ---------------- Name resolution ----------------
+# kind -> id -> (name, fetched_at); a bounded LRU persisted beside credentials.env between runs
+dNameLru = {"users": OrderedDict(), "organizations": OrderedDict(), "groups": OrderedDict()}
+dNameIdField = {"users": "assignee_id", "organizations": "organization_id", "groups": "group_id"}
+sNameCachePath = os.path.join(os.path.dirname(sCredsPath), "name_cache.json")
+oNameLock = threading.Lock()
+
+def nameRemember(sKind, nId, sName, fFetchedAt):
+    oLru = dNameLru[sKind]
+    oLru[nId] = (sName, fFetchedAt)
+    oLru.move_to_end(nId)
+    while len(oLru) > nNameCacheSize:
+        oLru.popitem(last=False)
+
+def nameLookup(sKind, nId):
+    if nId is None:
         return None
-    return None
+    with oNameLock:
+        tEntry = dNameLru[sKind].get(nId)
+        if tEntry is None or time.time() - tEntry[1] > nNameCacheTtl:
+            return None
+        dNameLru[sKind].move_to_end(nId)
+        return tEntry[0]
+
+def loadNameCache(sPath=sNameCachePath):
+    try:
+        with open(sPath, "r", encoding="utf-8") as hIn:
+            dDisk = json.load(hIn)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        print(f"Ignoring unreadable name cache {sPath}.")
+        return
+    if sZendeskSubdomain and dDisk.get("subdomain") != sZendeskSubdomain:
+        return # without a subdomain (--from-store, no credentials.env) the cache beside it is trusted
+    fNow = time.time()
+    with oNameLock:
+        for sKind in dNameLru:
+            # Stored oldest first, so replaying keeps the LRU order
+            for sId, sName, fFetchedAt in dDisk.get(sKind, []):
+                if fNow - fFetchedAt <= nNameCacheTtl:
+                    nameRemember(sKind, int(sId), sName, fFetchedAt)
+
+def saveNameCache(sPath=sNameCachePath):
+    with oNameLock:
+        dDisk = {"subdomain": sZendeskSubdomain}
+        for sKind, oLru in dNameLru.items():
+            dDisk[sKind] = [[nId, tEntry[0], tEntry[1]] for nId, tEntry in oLru.items()]
+    sTmpPath = sPath + ".tmp"
+    with open(sTmpPath, "w", encoding="utf-8") as hOut:
+        json.dump(dDisk, hOut, ensure_ascii=False)
+    os.replace(sTmpPath, sPath)
+
+def resolveNames(aTickets):
+    # One bulk request per 100 unknown ids instead of one lookup per ticket
+    fNow = time.time()
+    for sKind, sField in dNameIdField.items():
+        aMissing = set()
+        for dT in aTickets:
+            nId = dT.get(sField)
+            if nId is not None and nameLookup(sKind, nId) is None:
+                aMissing.add(nId)
+        if not aMissing or oArgs.replay or oArgs.from_store:
+            continue # offline: a replay knows the names in names.json, a store run those in the cache
+        dFound = {}
+        if sKind == "groups":
+            # Groups have no show_many; the whole list is small, so one pass refreshes them all
+            sPage = f"{sZendeskBaseUrl}/api/v2/groups.json?page[size]=100"
+            while sPage:
+                dJ = httpGetJson(sPage)
+                for dG in dJ.get("groups", []):
+                    dFound[dG.get("id")] = dG.get("name")
+                sPage = sNextLink(dJ)
+        else:
+            aIds = sorted(aMissing)
+            for i in range(0, len(aIds), 100):
+                sIds = ",".join(str(n) for n in aIds[i:i+100])
+                dJ = httpGetJson(f"{sZendeskBaseUrl}/api/v2/{sKind}/show_many.json?ids={sIds}")
+                for dItem in dJ.get(sKind, []):
+                    dFound[dItem.get("id")] = dItem.get("name")
+        with oNameLock:
+            for nId, sName in dFound.items():
+                nameRemember(sKind, nId, sName, fNow)
+            for nId in aMissing - dFound.keys():
+                nameRemember(sKind, nId, "", fNow) # deleted or not visible; do not ask again this lifetime
 
 def cellValue(vRaw):
     if vRaw is None:
@@ -580,128 +1315,960 @@ def cellValue(vRaw):
         return vRaw.replace("\r", " ").replace("\n", " ")
     return vRaw
 
+# One getter per output column, compiled once; custom columns read the record's id -> value dict
+def compileRowPlan():
+    aPlan = []
+    for sHeader in aOutputHeaders:
+        if sHeader == "Field's / Custom Field's ID":
+            aPlan.append(lambda dT: dT.custom_ids)
+        elif sHeader in STD_FIELD_GETTERS:
+            aPlan.append(STD_FIELD_GETTERS[sHeader])
+        elif sHeader in FIELD_NAME_MAP:
+            nFieldId = FIELD_IDS[FIELD_NAME_MAP.index(sHeader)]
+            aPlan.append(lambda dT, nFieldId=nFieldId: dT.custom_fields.get(nFieldId))
+        else:
+            aPlan.append(lambda dT: None)
+    return aPlan
+
+aRowPlan = compileRowPlan()
+
 def ticketRow(dT):
-    dRow = {}
-    dRow["ID"] = STD_FIELD_GETTERS["ID"](dT)
-    dRow["Organization"] = STD_FIELD_GETTERS["Organization"](dT)
-    aIds = []
-    for cf in (dT.get("custom_fields") or []):
-        try:
-            aIds.append(str(cf.get("id")))
-        except Exception:
-            pass
-    dRow["Field's / Custom Field's ID"] = ",".join(aIds)
-    for sKey in CSV_HEADERS:
-        if sKey in ("ID","Organization","Field's / Custom Field's ID"):
-            continue
-        if sKey in STD_FIELD_GETTERS:
-            dRow[sKey] = STD_FIELD_GETTERS[sKey](dT)
+    # Cell values in aOutputHeaders order, shared by the CSV and the workbook
+    return [cellValue(fGet(dT)) for fGet in aRowPlan]
+
+# ---------------- Parquet sink ----------------
+# Typed copy of the CSV part for Power BI: ids as int64, the "(YYYY/MM/DD HH:MM AM/PM)" columns as
+# timestamps, low-cardinality text dictionary-encoded. Rows collect into row groups of
+# ZENMASTER_PARQUET_ROW_GROUP; a part's last group is written when the part closes.
+PARQUET_INT_COLUMNS  = {"ID", "Organization", "Assignee", "Group"}
+PARQUET_DICT_COLUMNS = {"Status", "Type", "Ticket Type", "Roles"}
+dParquet = {"writer": None}
+
+def parquetColumnType(sHeader):
+    import pyarrow
+    if sHeader in PARQUET_INT_COLUMNS:
+        return pyarrow.int64()
+    if sHeader.endswith("(YYYY/MM/DD HH:MM AM/PM)"):
+        return pyarrow.timestamp("s")
+    if sHeader in PARQUET_DICT_COLUMNS:
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.string()
+
+# One converter per column, picked from the schema when the part opens
+def parquetIntCell(vCell):
+    if vCell == "" or vCell is None:
+        return None
+    try:
+        return int(vCell)
+    except (TypeError, ValueError):
+        return None
+
+def parquetTimestampCell(vCell):
+    return dtFromString_Ymd12h(vCell) if isinstance(vCell, str) and vCell else None
+
+def parquetTextCell(vCell):
+    if vCell == "" or vCell is None:
+        return None
+    return vCell if isinstance(vCell, str) else str(vCell)
+
+def parquetConverter(oType):
+    import pyarrow
+    if pyarrow.types.is_int64(oType):
+        return parquetIntCell
+    if pyarrow.types.is_timestamp(oType):
+        return parquetTimestampCell
+    return parquetTextCell
+
+def openParquetPart(sBaseName):
+    try:
+        import pyarrow, pyarrow.parquet
+    except ImportError:
+        print("pyarrow not installed, skipping Parquet output.")
+        return
+    dParquet["schema"] = pyarrow.schema([(sHeader, parquetColumnType(sHeader)) for sHeader in aOutputHeaders])
+    dParquet["converters"] = [parquetConverter(oField.type) for oField in dParquet["schema"]]
+    dParquet["name"] = sBaseName + ".parquet"
+    dParquet["writer"] = pyarrow.parquet.ParquetWriter(dParquet["name"], dParquet["schema"], compression="zstd")
+    dParquet["rows"] = []
+
+def writeParquetGroup():
+    import pyarrow
+    aRows = dParquet["rows"]
+    if not aRows:
+        return
+    aArrays = []
+    for i, (oField, fConvert) in enumerate(zip(dParquet["schema"], dParquet["converters"])):
+        aValues = [fConvert(aRow[i]) for aRow in aRows]
+        if pyarrow.types.is_dictionary(oField.type):
+            aArrays.append(pyarrow.array(aValues, type=pyarrow.string()).dictionary_encode())
+        else:
+            aArrays.append(pyarrow.array(aValues, type=oField.type))
+    dParquet["writer"].write_table(pyarrow.Table.from_arrays(aArrays, schema=dParquet["schema"]))
+    dParquet["rows"] = []
+
+def writeParquetRows(aRows):
+    if dParquet["writer"] is None:
+        return
+    dParquet["rows"].extend(aRows)
+    if len(dParquet["rows"]) >= nParquetRowGroup:
+        writeParquetGroup()
+
+def closeParquetPart():
+    if dParquet["writer"] is None:
+        return
+    writeParquetGroup()
+    dParquet["writer"].close()
+    dParquet["writer"] = None
+    print(f"Wrote Parquet file -> {dParquet['name']}")
+
+# ---------------- Rolling output ----------------
+# One CSV (and workbook) stays open across batches. A new part starts after the batch that takes
+# it past ZENMASTER_ROTATE_ROWS rows or ZENMASTER_ROTATE_MB megabytes of CSV, or mid-batch when
+# the sectioned workbook (4 sheet rows per ticket) would pass Excel's row limit.
+dOut = {"csv": None, "part": 0}
+
+def openOutputPart(bWantWorkbook):
+    oNowPH = datetime.datetime.now(ZoneInfo("Asia/Manila"))
+    sStamp = oNowPH.strftime("%Y%m%d_%I%M%S_%p").lower()
+    dOut["part"] += 1
+    sBaseName = f"zendesk_tickets_{sStamp}_part_{dOut['part']:03d}"
+    dOut["csvName"] = sBaseName + ".csv"
+    dOut["csv"] = open(dOut["csvName"], "w", newline="", encoding="utf-8-sig")
+    dOut["csvWriter"] = csv.writer(dOut["csv"], quoting=csv.QUOTE_ALL, lineterminator="\r\n")
+    dOut["csvWriter"].writerow(aOutputHeaders)
+    dOut["rows"] = 0
+    dOut["wb"] = None
+    if bParquet:
+        openParquetPart(sBaseName)
+    if not bWantWorkbook or bTableWorkbook:
+        return
+    try:
+        import xlsxwriter
+    except ImportError:
+        print("xlsxwriter not installed, skipping workbook.")
+        return
+    # constant_memory keeps only the current row in memory; the file is complete once closed
+    dOut["wbName"] = sBaseName + "_formatted.xlsx"
+    dOut["wb"] = xlsxwriter.Workbook(dOut["wbName"], {"constant_memory": True})
+    dOut["ws"] = dOut["wb"].add_worksheet("tickets")
+    dOut["fmtSection"] = dOut["wb"].add_format({"bold": True, "align": "center", "valign": "vcenter", "bg_color": "#BDD7EE"})
+    dOut["fmtHead"]    = dOut["wb"].add_format({"bold": True, "border": 1, "text_wrap": True, "align": "center", "valign": "vcenter", "bg_color": "#D9E1F2"})
+    dOut["fmtValue"]   = dOut["wb"].add_format({"border": 1, "text_wrap": True, "align": "left", "valign": "vcenter"})
+    dOut["wsRow"] = 0
+    for i in range(len(aOutputHeaders)):
+        dOut["ws"].set_column(i, i, 28)
+
+def closeOutputPart():
+    if dOut["csv"] is None:
+        return
+    dOut["csv"].close()
+    dOut["csv"] = None
+    print(f"Wrote {dOut['rows']} tickets -> {dOut['csvName']}")
+    closeParquetPart()
+    if dOut["wb"] is not None:
+        dOut["wb"].close()
+        dOut["wb"] = None
+        print(f"Wrote formatted workbook -> {dOut['wbName']}")
+
+def writeWorkbookSection(dT, aRow):
+    oWs = dOut["ws"]
+    nRow = dOut["wsRow"]
+    nTicketId = dT.get("id", "UNKNOWN")
+    sRole     = STD_FIELD_GETTERS["Roles"](dT).upper()
+    oWs.merge_range(nRow, 0, nRow, len(aOutputHeaders)-1, f"{sRole} - Ticket {nTicketId}", dOut["fmtSection"])
+    oWs.set_row(nRow, 20)
+    nRow += 1
+    for i, col in enumerate(aOutputHeaders):
+        oWs.write(nRow, i, col, dOut["fmtHead"])
+    oWs.set_row(nRow, 22)
+    nRow += 1
+    for i, vCell in enumerate(aRow):
+        oWs.write(nRow, i, vCell, dOut["fmtValue"])
+    oWs.set_row(nRow, 20)
+    dOut["wsRow"] = nRow + 2
+
+# ---------------- Table workbook ----------------
+# ZENMASTER_WORKBOOK_LAYOUT=table: one workbook per run, a single header row and one plain row per
+# ticket, autofiltered at close. (add_table() is not available in constant_memory mode.)
+# A new workbook starts only when Excel's row limit is reached.
+EXCEL_MAX_ROWS = 1048576
+dTableWb = {"wb": None, "count": 0, "missing": False}
+
+def openTableWorkbook():
+    try:
+        import xlsxwriter
+    except ImportError:
+        print("xlsxwriter not installed, skipping workbook.")
+        dTableWb["missing"] = True
+        return
+    oNowPH = datetime.datetime.now(ZoneInfo("Asia/Manila"))
+    sStamp = oNowPH.strftime("%Y%m%d_%I%M%S_%p").lower()
+    dTableWb["count"] += 1
+    dTableWb["name"] = f"zendesk_tickets_{sStamp}_table_{dTableWb['count']:02d}.xlsx"
+    dTableWb["wb"] = xlsxwriter.Workbook(dTableWb["name"], {"constant_memory": True})
+    oWs = dTableWb["wb"].add_worksheet("tickets")
+    oFmtHead = dTableWb["wb"].add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+    oWs.set_column(0, len(aOutputHeaders)-1, 28)
+    oWs.write_row(0, 0, aOutputHeaders, oFmtHead)
+    oWs.freeze_panes(1, 0)
+    dTableWb["ws"] = oWs
+    dTableWb["row"] = 1
+
+def writeTableRows(aRows):
+    for aRow in aRows:
+        if dTableWb["wb"] is not None and dTableWb["row"] >= EXCEL_MAX_ROWS:
+            closeTableWorkbook()
+        if dTableWb["wb"] is None:
+            if dTableWb["missing"]:
+                return
+            openTableWorkbook()
+            if dTableWb["wb"] is None:
+                return
+        dTableWb["ws"].write_row(dTableWb["row"], 0, aRow)
+        dTableWb["row"] += 1
+
+def closeTableWorkbook():
+    if dTableWb["wb"] is None:
+        return
+    dTableWb["ws"].autofilter(0, 0, dTableWb["row"]-1, len(aOutputHeaders)-1)
+    dTableWb["wb"].close()
+    dTableWb["wb"] = None
+    print(f"Wrote {dTableWb['row']-1} tickets to table workbook -> {dTableWb['name']}")
+
+def writeBatchFiles(aTickets, bWantWorkbook):
+    aTicketsSorted = sorted(aTickets, key=lambda d: d.get("id", 0))
+    aRows = [ticketRow(dT) for dT in aTicketsSorted]
+    nDone = 0
+    while nDone < len(aRows):
+        if dOut["csv"] is None:
+            openOutputPart(bWantWorkbook)
+        nTake = len(aRows) - nDone
+        if dOut["wb"] is not None:
+            # A section takes 3 rows plus a blank one; the last must still fit below the limit
+            nTake = min(nTake, (EXCEL_MAX_ROWS - dOut["wsRow"] + 1) // 4)
+            if nTake <= 0:
+                closeOutputPart()
+                continue
+        for dT, aRow in zip(aTicketsSorted[nDone:nDone+nTake], aRows[nDone:nDone+nTake]):
+            dOut["csvWriter"].writerow(aRow)
+            if dOut["wb"] is not None:
+                writeWorkbookSection(dT, aRow)
+        dOut["rows"] += nTake
+        writeParquetRows(aRows[nDone:nDone+nTake])
+        nDone += nTake
+    if bWantWorkbook and bTableWorkbook:
+        writeTableRows(aRows)
+    # A checkpoint may follow, so the CSV on disk must already hold this batch
+    dOut["csv"].flush()
+    if dOut["rows"] >= nRotateRows or dOut["csv"].tell() >= nRotateMb * 1024 * 1024:
+        closeOutputPart()
+    return len(aRows)
+
+def flushBatch():
+    # Caller holds oBatchLock. In pipeline mode the batch is only handed to the filter stage,
+    # with a copy of the role positions it ends at; the writer stage checkpoints from that copy.
+    global aTicketList, nBatchIndex, nTotalWritten, bMakeWorkbook
+    if not aTicketList:
+        return
+    aBatch = aTicketList[:nBatchSize]
+    aTicketList = aTicketList[nBatchSize:]
+    if bStore and not bPipeline:
+        storeUpsert(aBatch)
+    if bPipeline:
+        if bDedup:
+            markWriting(aBatch)
+        qFilter.put((nBatchIndex, aBatch, {sRole: dict(dPos) for sRole, dPos in dRolePos.items()}))
+        nBatchIndex += 1
+        return
+    aFiltered = applyFilters(aBatch)
+    if aFiltered:
+        nTotalWritten += writeBatchFiles(aFiltered, bMakeWorkbook)
+    if bDedup:
+        markFlushed(aBatch, aFiltered)
+    nBatchIndex += 1
+
+# ---------------- Pipeline ----------------
+# Harvest workers -> qFilter -> filter stage -> qWrite -> writer stage. Both queues are bounded,
+# so a slow disk stalls the fetchers after nQueueDepth batches instead of buffering the account.
+qFilter = queue.Queue(maxsize=nQueueDepth)
+qWrite = queue.Queue(maxsize=nQueueDepth)
+dPipeline = {"threads": [], "error": None}
+
+def pipelineFailed(oErr):
+    if dPipeline["error"] is None:
+        dPipeline["error"] = oErr
+    oStopEvent.set() # harvests stop at their next page; the stages keep draining so nobody blocks
+
+def filterStage():
+    while True:
+        tItem = qFilter.get()
+        if tItem is None:
+            qWrite.put(None)
+            return
+        nIdx, aBatch, dRoles = tItem
+        aFiltered = []
+        if dPipeline["error"] is None:
+            try:
+                if bStore:
+                    storeUpsert(aBatch)
+                aFiltered = applyFilters(aBatch)
+                if aFiltered and bResolveNames:
+                    resolveNames(aFiltered)
+            except BaseException as oErr:
+                pipelineFailed(oErr)
+        qWrite.put((nIdx, aBatch, aFiltered, dRoles))
+
+def writerStage():
+    global nTotalWritten
+    while True:
+        tItem = qWrite.get()
+        if tItem is None:
+            return
+        if dPipeline["error"] is not None:
             continue
+        nIdx, aBatch, aFiltered, dRoles = tItem
         try:
-            idx = FIELD_NAME_MAP.index(sKey)
-            nFieldId = FIELD_IDS[idx]
-            v = customVal(dT, nFieldId)
-            dRow[sKey] = v
-        except Exception:
-            dRow[sKey] = ""
-    return dRow
+            if aFiltered:
+                nTotalWritten += writeBatchFiles(aFiltered, bMakeWorkbook)
+            if bDedup:
+                markFlushed(aBatch, aFiltered)
+            saveCheckpoint(nIdx + 1, dRoles)
+        except BaseException as oErr:
+            pipelineFailed(oErr)
 
-def writeBatchFiles(aTickets, nBatchIdx, bWantWorkbook):
-    aTicketsSorted = sorted(aTickets, key=lambda d: d.get("id", 0))
+def startPipeline():
+    for fStage, sName in ((filterStage, "filter"), (writerStage, "writer")):
+        oThread = threading.Thread(target=fStage, name=sName, daemon=True)
+        oThread.start()
+        dPipeline["threads"].append(oThread)
+
+def stopPipeline():
+    # Called once every batch is queued: the sentinel drains both stages in order
+    qFilter.put(None)
+    for oThread in dPipeline["threads"]:
+        oThread.join()
+    if dPipeline["error"] is not None:
+        oErr = dPipeline["error"]
+        if isinstance(oErr, SystemExit):
+            raise oErr
+        print(f"Writing batches failed: {oErr}")
+        sys.exit(1)
+
+def finishBatches():
+    try:
+        with oBatchLock:
+            while aTicketList:
+                flushBatch()
+                if not aTicketList and not bPipeline:
+                    saveCheckpoint()
+        if bPipeline:
+            stopPipeline()
+    finally:
+        closeOutputPart()
+        closeTableWorkbook()
+        closeRawArchive()
+        closeStore()
+
+# ---------------- Checkpoint / resume ----------------
+# Rewritten after every flush, when aTicketList is empty (in pipeline mode: after the writer
+# finishes a batch, from the positions the batch was cut at): each role's page URL plus how many
+# items of that page were consumed, the next batch index and the running total.
+sCheckpointPath = os.path.join(os.path.dirname(sCredsPath), "zenmaster_checkpoint.json")
+dRolePos = {}
+
+def notePosition(sRoleLabel, sHarvest, tPos):
+    # Caller holds oBatchLock, so a flush never sees a position ahead of aTicketList
+    if tPos is not None:
+        dRolePos[sRoleLabel] = {"harvest": sHarvest, "page": tPos[0], "offset": tPos[1], "done": False}
+
+def markRoleDone(sRoleLabel, sHarvest):
+    with oBatchLock:
+        dPos = dRolePos.setdefault(sRoleLabel, {"harvest": sHarvest, "page": None, "offset": 0})
+        dPos["done"] = not oStopEvent.is_set()
+
+def saveCheckpoint(nNextBatch=None, dRoles=None):
+    # The pipeline's writer passes the batch index and role positions its batch was cut at
+    if oArgs.from_store:
+        return # nothing was harvested, so there is nothing to resume
+    with oDedupLock:
+        aLines = aSeenLog[:]
+        aSeenLog.clear()
+    if aLines:
+        with open(sSeenLogPath, "a", encoding="utf-8") as hLog:
+            hLog.write("\n".join(aLines) + "\n")
+    sTmpPath = sCheckpointPath + ".tmp"
+    with open(sTmpPath, "w", encoding="utf-8") as hOut:
+        json.dump({
+            "subdomain": sZendeskSubdomain,
+            "proposition": formatProposition(),
+            "batch_index": nBatchIndex if nNextBatch is None else nNextBatch,
+            "total_written": nTotalWritten,
+            "roles": dRolePos if dRoles is None else dRoles,
+            "saved_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }, hOut, ensure_ascii=False)
+    os.replace(sTmpPath, sCheckpointPath)
+
+def loadCheckpoint():
+    try:
+        with open(sCheckpointPath, "r", encoding="utf-8") as hIn:
+            dCheckpoint = json.load(hIn)
+    except FileNotFoundError:
+        print("No checkpoint to resume from, starting a fresh run.")
+        return None
+    except (OSError, ValueError):
+        print(f"Unreadable checkpoint {sCheckpointPath}, starting a fresh run.")
+        return None
+    if dCheckpoint.get("subdomain") != sZendeskSubdomain:
+        print("Checkpoint belongs to another Zendesk subdomain, starting a fresh run.")
+        return None
+    return dCheckpoint
+
+def resumeJobs(aJobs, dCheckpoint):
+    aOut = []
+    dRoles = dCheckpoint.get("roles") or {}
+    for fHarvest, tArgs, dKw in aJobs:
+        dPos = dRoles.get(tArgs[0])
+        if not dPos:
+            aOut.append((fHarvest, tArgs, dKw))
+        elif dPos.get("harvest") != fHarvest.__name__:
+            print(f"The {tArgs[0]} harvest changed mode since the checkpoint, restarting it from the beginning.")
+            aOut.append((fHarvest, tArgs, dKw))
+        elif dPos.get("done"):
+            dRolePos[tArgs[0]] = dPos
+            print(f"Skipping {tArgs[0]}, finished before the interruption.")
+        else:
+            dRolePos[tArgs[0]] = dPos
+            print(f"Resuming {tArgs[0]} at {dPos['page']} (skipping {dPos['offset']} item(s) of that page).")
+            aOut.append((fHarvest, tArgs, {"sResumeUrl": dPos["page"], "nSkip": dPos["offset"]}))
+    return aOut
+
+# ---------------- Cross-role dedup ----------------
+# id -> [roles, state]. The roles list is shared with the buffered ticket's "_roles", so a role
+# found while the ticket still waits in aTicketList lands in its row. Roles found after the row
+# was written, or in pipeline mode after its batch left aTicketList ("writing"), go to a small
+# ID/Roles supplement at the end of the run.
+dTicketRoles = {}
+setLateRoles = set()
+setStoreRoles = set() # roles found after the ticket's store upsert
+aSeenLog = [] # lines not yet appended to the checkpoint's .seen file
+oDedupLock = threading.Lock() # the pipeline's writer marks batches outside oBatchLock
+sSeenLogPath = sCheckpointPath[:-len(".json")] + ".seen"
+
+def dedupTicket(dT, sRoleLabel):
+    # Caller holds oBatchLock; returns False when the ticket was already harvested for another role
+    nId = dT.get("id")
+    if nId is None:
+        return True
+    with oDedupLock:
+        return dedupLocked(dT, nId, sRoleLabel)
+
+def dedupLocked(dT, nId, sRoleLabel):
+    lEntry = dTicketRoles.get(nId)
+    if lEntry is None:
+        dTicketRoles[nId] = [[sRoleLabel], "buffered"]
+        dT["_roles"] = dTicketRoles[nId][0]
+        return True
+    if sRoleLabel not in lEntry[0]:
+        lEntry[0].append(sRoleLabel)
+        if lEntry[1] in ("writing", "written"):
+            setLateRoles.add(nId)
+        if bStore and lEntry[1] != "buffered":
+            setStoreRoles.add(nId)
+        if lEntry[1] in ("written", "skipped"):
+            aSeenLog.append(json.dumps([nId, lEntry[1], lEntry[0]]))
+    return False
+
+def markWriting(aBatch):
+    # Pipeline hand-off, caller holds oBatchLock: the writer thread builds rows from a copy of the
+    # roles known now, so a role appended while the batch is in flight cannot race the row
+    with oDedupLock:
+        for dT in aBatch:
+            lEntry = dTicketRoles.get(dT.get("id"))
+            if lEntry is not None and lEntry[1] == "buffered":
+                lEntry[1] = "writing"
+                dT["_roles"] = list(lEntry[0])
+
+def markFlushed(aBatch, aFiltered):
+    setWritten = {id(dT) for dT in aFiltered}
+    with oDedupLock:
+        markLocked(aBatch, setWritten)
+
+def markLocked(aBatch, setWritten):
+    for dT in aBatch:
+        lEntry = dTicketRoles.get(dT.get("id"))
+        if lEntry is not None:
+            lEntry[1] = "written" if id(dT) in setWritten else "skipped"
+            if lEntry[1] == "skipped":
+                setLateRoles.discard(dT.get("id")) # found late while in flight, but filtered out
+            aSeenLog.append(json.dumps([dT.get("id"), lEntry[1], lEntry[0]]))
+
+def loadSeenLog():
+    try:
+        with open(sSeenLogPath, "r", encoding="utf-8") as hIn:
+            for sLine in hIn:
+                try:
+                    nId, sState, aRoles = json.loads(sLine)
+                except ValueError:
+                    continue # a line cut short by the crash
+                dTicketRoles[nId] = [aRoles, sState]
+    except FileNotFoundError:
+        pass
+
+def writeLateRoles():
+    oNowPH = datetime.datetime.now(ZoneInfo("Asia/Manila"))
+    sStamp = oNowPH.strftime("%Y%m%d_%I%M%S_%p").lower()
+    sFileName = f"zendesk_tickets_{sStamp}_roles.csv"
+    with open(sFileName, "w", newline="", encoding="utf-8-sig") as hCsv:
+        oCsvWriter = csv.writer(hCsv, quoting=csv.QUOTE_ALL, lineterminator="\r\n")
+        oCsvWriter.writerow(["ID", "Roles"])
+        for nId in sorted(setLateRoles):
+            oCsvWriter.writerow([nId, ",".join(dTicketRoles[nId][0])])
+    print(f"Wrote complete roles for {len(setLateRoles)} ticket(s) found again after their batch was written -> {sFileName}")
+
+# ---------------- Raw archive ----------------
+# ZENMASTER_ARCHIVE=gzip|zstd appends every harvested ticket to one compressed NDJSON file per run,
+# before projection, dedup and filtering. Each line is {"role": ..., "ticket": <as received>}.
+dArchive = {"h": None}
+oArchiveLock = threading.Lock()
+
+def openRawArchive():
     oNowPH = datetime.datetime.now(ZoneInfo("Asia/Manila"))
     sStamp = oNowPH.strftime("%Y%m%d_%I%M%S_%p").lower()
-    sCsvFileName = f"zendesk_tickets_{sStamp}_batch_{nBatchIdx:05d}.csv"
-    with open(sCsvFileName, "w", newline="", encoding="utf-8-sig") as hCsv:
-        oCsvWriter = csv.DictWriter(
-            hCsv,
-            fieldnames=CSV_HEADERS,
-            extrasaction="ignore",
-            quoting=csv.QUOTE_ALL,
-            lineterminator="\r\n",
-        )
-        oCsvWriter.writeheader()
-        for dT in aTicketsSorted:
-            dRow = ticketRow(dT)
-            oCsvWriter.writerow({k: cellValue(dRow.get(k)) for k in CSV_HEADERS})
-    sWorkbookName = None
-    if bWantWorkbook:
+    sMode = sArchiveMode
+    if sMode == "zstd":
         try:
-            import xlsxwriter
+            import zstandard
         except ImportError:
-            print("xlsxwriter not installed, skipping workbook.")
-        else:
-            sWorkbookName = f"zendesk_tickets_{sStamp}_batch_{nBatchIdx:05d}_formatted.xlsx"
-            oWb = xlsxwriter.Workbook(sWorkbookName, {"constant_memory": True})
-            oWs = oWb.add_worksheet("tickets")
-            oFmtSection = oWb.add_format({"bold": True, "align": "center", "valign": "vcenter", "bg_color": "#BDD7EE"})
-            oFmtHead   = oWb.add_format({"bold": True, "border": 1, "text_wrap": True, "align": "center", "valign": "vcenter", "bg_color": "#D9E1F2"})
-            oFmtField  = oWb.add_format({"border": 1, "text_wrap": True, "align": "center", "valign": "vcenter"})
-            oFmtValue  = oWb.add_format({"border": 1, "text_wrap": True, "align": "left", "valign": "vcenter"})
-            nRow = 0
-            for dT in aTicketsSorted:
-                nTicketId = dT.get("id", "UNKNOWN")
-                sRole     = dT.get("_role", "unknown").upper()
-                oWs.merge_range(nRow, 0, nRow, len(CSV_HEADERS)-1, f"{sRole} - Ticket {nTicketId}", oFmtSection)
-                oWs.set_row(nRow, 20)
-                nRow += 1
-                for i, col in enumerate(CSV_HEADERS):
-                    oWs.write(nRow, i, col, oFmtHead)
-                oWs.set_row(nRow, 22)
-                nRow += 1
-                dRow = ticketRow(dT)
-                for i, col in enumerate(CSV_HEADERS):
-                    oWs.write(nRow, i, cellValue(dRow.get(col)), oFmtValue)
-                oWs.set_row(nRow, 20)
-                nRow += 2
-            for i in range(len(CSV_HEADERS)):
-                oWs.set_column(i, i, 28)
-            oWb.close()
-    print(f"Wrote {len(aTicketsSorted)} tickets -> {sCsvFileName}")
-    if bWantWorkbook and sWorkbookName:
-        print(f"Wrote formatted workbook -> {sWorkbookName}")
-    return len(aTicketsSorted)
+            print("zstandard not installed, archiving with gzip instead.")
+            sMode = "gzip"
+    if sMode == "zstd":
+        dArchive["name"] = f"zendesk_raw_{sStamp}.ndjson.zst"
+        hRaw = open(dArchive["name"], "wb")
+        oStream = zstandard.ZstdCompressor(level=10).stream_writer(hRaw)
+        dArchive["h"] = io.TextIOWrapper(oStream, encoding="utf-8", newline="\n")
+    else:
+        dArchive["name"] = f"zendesk_raw_{sStamp}.ndjson.gz"
+        dArchive["h"] = gzip.open(dArchive["name"], "wt", encoding="utf-8", newline="\n", compresslevel=6)
+    dArchive["rows"] = 0
 
-def flushBatch():
-    global aTicketList, nBatchIndex, bMakeWorkbook
-    if not aTicketList:
+def archiveRawTicket(dT, sRoleLabel):
+    # Our own "_" bookkeeping never reaches the archive, only the API's fields
+    dRaw = {k: v for k, v in dT.items() if not k.startswith("_")}
+    sLine = json.dumps({"role": sRoleLabel, "ticket": dRaw}, ensure_ascii=False, separators=(",", ":")) + "\n"
+    with oArchiveLock:
+        if dArchive["h"] is None:
+            openRawArchive()
+        dArchive["h"].write(sLine)
+        dArchive["rows"] += 1
+
+def closeRawArchive():
+    with oArchiveLock:
+        if dArchive["h"] is None:
+            return
+        dArchive["h"].close()
+        dArchive["h"] = None
+        print(f"Archived {dArchive['rows']} raw tickets -> {dArchive['name']}")
+
+# ---------------- Local ticket store ----------------
+# ZENMASTER_STORE=1 upserts every harvested ticket into zenmaster_store.sqlite by id, leaving rows
+# whose updated_at did not change alone. --from-store then filters and exports from it offline.
+# A ticket's stored roles are replaced the first time this run upserts it; roles dedup finds after
+# that (setStoreRoles) are added when the store closes.
+sStorePath = os.path.join(os.path.dirname(sCredsPath), "zenmaster_store.sqlite")
+dStore = {"db": None, "upserts": 0, "unchanged": 0, "ids": set()}
+oStoreLock = threading.Lock()
+
+def openStore():
+    oDb = sqlite3.connect(sStorePath, check_same_thread=False)
+    oDb.executescript("""
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY, updated_at TEXT, created_at TEXT, status TEXT, type TEXT,
+            organization_id INTEGER, assignee_id INTEGER, group_id INTEGER,
+            subject TEXT, description TEXT, tags TEXT, custom_ids TEXT);
+        CREATE TABLE IF NOT EXISTS custom_field_values (
+            ticket_id INTEGER, field_id INTEGER, value, PRIMARY KEY (ticket_id, field_id)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS ticket_roles (
+            ticket_id INTEGER, role TEXT, PRIMARY KEY (ticket_id, role)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS ix_tickets_created ON tickets (created_at);
+        CREATE INDEX IF NOT EXISTS ix_tickets_updated ON tickets (updated_at);
+        CREATE INDEX IF NOT EXISTS ix_tickets_status ON tickets (status);
+        CREATE INDEX IF NOT EXISTS ix_custom_field_value ON custom_field_values (field_id, value);
+    """)
+    dStore["db"] = oDb
+
+def storeCell(v):
+    return json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+
+def storeUpsert(aBatch):
+    with oStoreLock:
+        if dStore["db"] is None:
+            openStore()
+        oDb = dStore["db"]
+        with oDb: # one transaction per batch
+            for dT in aBatch:
+                if dT.id is None:
+                    continue
+                if dT.id not in dStore["ids"]: # without dedup each role's copy arrives separately
+                    dStore["ids"].add(dT.id)
+                    oDb.execute("DELETE FROM ticket_roles WHERE ticket_id = ?", (dT.id,))
+                oDb.executemany("INSERT OR IGNORE INTO ticket_roles VALUES (?, ?)",
+                                [(dT.id, sRole) for sRole in (dT._roles or [dT._role])])
+                tRow = oDb.execute("SELECT updated_at FROM tickets WHERE id = ?", (dT.id,)).fetchone()
+                if tRow is not None and dT.updated_at is not None and tRow[0] == dT.updated_at:
+                    dStore["unchanged"] += 1
+                    continue
+                oDb.execute("INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (dT.id, dT.updated_at, dT.created_at, dT.status, dT.type, dT.organization_id,
+                             dT.assignee_id, dT.group_id, dT.subject, dT.description,
+                             json.dumps(list(dT.tags), ensure_ascii=False), dT.custom_ids))
+                oDb.execute("DELETE FROM custom_field_values WHERE ticket_id = ?", (dT.id,))
+                oDb.executemany("INSERT INTO custom_field_values VALUES (?, ?, ?)",
+                                [(dT.id, nId, storeCell(v)) for nId, v in dT.custom_fields.items()])
+                dStore["upserts"] += 1
+
+def storeLateRoles():
+    with oDedupLock:
+        aRows = [(nId, sRole) for nId in setStoreRoles for sRole in dTicketRoles[nId][0]]
+        setStoreRoles.clear()
+    if not aRows:
+        return
+    with oStoreLock:
+        if dStore["db"] is None:
+            openStore()
+        with dStore["db"]:
+            dStore["db"].executemany("INSERT OR IGNORE INTO ticket_roles VALUES (?, ?)", aRows)
+
+def closeStore():
+    if bStore:
+        storeLateRoles()
+    with oStoreLock:
+        if dStore["db"] is None:
+            return
+        dStore["db"].close()
+        dStore["db"] = None
+        print(f"Ticket store: {dStore['upserts']} new or updated, {dStore['unchanged']} unchanged -> {sStorePath}")
+
+def storeTickets():
+    oDb = sqlite3.connect(sStorePath)
+    try:
+        dRoles = {}
+        for nId, sRole in oDb.execute("SELECT ticket_id, role FROM ticket_roles ORDER BY ticket_id, role"):
+            dRoles.setdefault(nId, []).append(sRole)
+        dCustom = {}
+        for nId, nFieldId, v in oDb.execute("SELECT ticket_id, field_id, value FROM custom_field_values"):
+            dCustom.setdefault(nId, []).append({"id": nFieldId, "value": v})
+        for tRow in oDb.execute("SELECT id, updated_at, created_at, status, type, organization_id, assignee_id,"
+                                " group_id, subject, description, tags, custom_ids FROM tickets ORDER BY id"):
+            oT = TicketRecord({
+                "id": tRow[0], "updated_at": tRow[1], "created_at": tRow[2], "status": tRow[3], "type": tRow[4],
+                "organization_id": tRow[5], "assignee_id": tRow[6], "group_id": tRow[7], "subject": tRow[8],
+                "description": tRow[9], "tags": json.loads(tRow[10] or "[]"), "custom_fields": dCustom.get(tRow[0]),
+            }, "unknown")
+            oT.custom_ids = tRow[11] or ""
+            oT._roles = dRoles.get(tRow[0])
+            yield oT
+    finally:
+        oDb.close()
+
+def serveFromStore():
+    if not os.path.exists(sStorePath):
+        print(f"No ticket store at {sStorePath}; run once with ZENMASTER_STORE=1 first.")
+        sys.exit(1)
+    for oT in storeTickets():
+        with oBatchLock:
+            aTicketList.append(oT)
+            if len(aTicketList) >= nBatchSize:
+                flushBatch()
+
+def ingestTicket(dT, sRoleLabel, sHarvest=None, tPos=None, bPushdown=False):
+    global aTicketList
+    if sArchiveMode and not oStopEvent.is_set():
+        archiveRawTicket(dT, sRoleLabel)
+    dT = TicketRecord(dT, sRoleLabel, bPushdown)
+    # Harvests may run on several workers; they all feed the same batch/filter/write pipeline
+    with oBatchLock:
+        if oStopEvent.is_set():
+            return # the run is winding down; finishBatches has or will cut the last batch
+        notePosition(sRoleLabel, sHarvest, tPos)
+        if bDedup and not dedupTicket(dT, sRoleLabel):
+            return
+        aTicketList.append(dT)
+        if len(aTicketList) >= nBatchSize:
+            flushBatch()
+            if not aTicketList and not bPipeline:
+                saveCheckpoint()
+
+def harvestTickets(sRoleLabel, sStartUrl, sResumeUrl=None, nSkip=0):
+    sPage = sResumeUrl or sStartUrl
+    while sPage and not oStopEvent.is_set():
+        dMeta = {}
+        for nItem, dT in enumerate(iterPageItems(sPage, "tickets", dMeta), 1):
+            if nItem > nSkip:
+                ingestTicket(dT, sRoleLabel, "harvestTickets", (sPage, nItem))
+        nSkip = 0
+        sPage = sNextLink(dMeta)
+    markRoleDone(sRoleLabel, "harvestTickets")
+    return
+
+def searchStartUrl(sQuery):
+    if sPushdownQuery:
+        sQuery = sQuery + "+" + sPushdownQuery
+    if bSearchExport:
+        # Cursor-paginated and uncapped; the export endpoint takes the type through filter[type]
+        sQuery = "+".join([t for t in sQuery.split("+") if t and t != "type:ticket"])
+        sEncoded = urllib.parse.quote(sQuery, safe=":+")
+        return f"{sZendeskBaseUrl}/api/v2/search/export.json?query={sEncoded}&filter[type]=ticket&page[size]=100"
+    sEncoded = urllib.parse.quote(sQuery, safe=":+")
+    return f"{sZendeskBaseUrl}/api/v2/search.json?query={sEncoded}&per_page=100"
+
+def ingestSearchHit(sRoleLabel, dHit, tPos=None):
+    if dHit.get("result_type", "ticket") == "ticket":
+        # Hits of a pushed-down search already passed the server-side atoms
+        ingestTicket(dHit, sRoleLabel, "harvestSearch", tPos, bool(sPushdownQuery))
+    else:
+        with oBatchLock:
+            notePosition(sRoleLabel, "harvestSearch", tPos)
+
+def warnSearchCap(sRoleLabel, dJ, bWarned):
+    if not bSearchExport and not bWarned and (dJ.get("count") or 0) > 1000:
+        print(f"Search for {sRoleLabel} matches {dJ['count']} tickets but search.json stops at 1000; set ZENMASTER_SEARCH_EXPORT=1 to get them all.")
+        bWarned = True
+    return bWarned
+
+def harvestSearch(sRoleLabel, sQuery, sResumeUrl=None, nSkip=0):
+    sPage = sResumeUrl or searchStartUrl(sQuery)
+    bWarned = False
+    while sPage and not oStopEvent.is_set():
+        dMeta = {}
+        for nItem, dHit in enumerate(iterPageItems(sPage, "results", dMeta), 1):
+            if nItem > nSkip:
+                ingestSearchHit(sRoleLabel, dHit, (sPage, nItem))
+        nSkip = 0
+        bWarned = warnSearchCap(sRoleLabel, dMeta, bWarned)
+        sPage = sNextLink(dMeta)
+    markRoleDone(sRoleLabel, "harvestSearch")
+    return
+
+# Incremental export keeps its cursor beside credentials.env so the next run only sees changed tickets
+sCursorPath = os.path.join(os.path.dirname(sCredsPath), "incremental_cursor.json")
+sPendingCursor = None
+
+def loadIncrementalCursor():
+    try:
+        with open(sCursorPath, "r", encoding="utf-8") as hIn:
+            dState = json.load(hIn)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        print(f"Ignoring unreadable cursor file {sCursorPath}.")
+        return None
+    if dState.get("subdomain") != sZendeskSubdomain:
+        return None
+    return dState.get("cursor")
+
+def saveIncrementalCursor(sCursor):
+    sTmpPath = sCursorPath + ".tmp"
+    with open(sTmpPath, "w", encoding="utf-8") as hOut:
+        json.dump({
+            "subdomain": sZendeskSubdomain,
+            "cursor": sCursor,
+            "saved_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }, hOut)
+    os.replace(sTmpPath, sCursorPath)
+
+def incrementalStartTime():
+    if not sIncrementalStart:
         return 0
-    aBatch = aTicketList[:50]
-    aTicketList = aTicketList[50:]
-    aFiltered = applyFilters(aBatch)
-    if not aFiltered:
-        nBatchIndex += 1
+    try:
+        oStart = datetime.datetime.fromisoformat(sIncrementalStart)
+    except ValueError:
+        print(f"Invalid ZENMASTER_INCREMENTAL_START {sIncrementalStart!r}, exporting from the beginning.")
         return 0
-    nWritten = writeBatchFiles(aFiltered, nBatchIndex, bMakeWorkbook)
-    nBatchIndex += 1
-    return nWritten
-
-def harvestTickets(sRoleLabel, sStartUrl):
-    global aTicketList, nBatchIndex, nTotalWritten
-    sPage = sStartUrl
-    while sPage:
-        dJ = httpGetJson(sPage)
-        for dT in dJ.get("tickets", []):
-            dT["_role"] = sRoleLabel
-            aTicketList.append(dT)
-            if len(aTicketList) >= 50:
-                nTotalWritten += flushBatch()
-        sPage = sNextLink(dJ)
+    if oStart.tzinfo is None:
+        oStart = oStart.replace(tzinfo=datetime.timezone.utc)
+    return int(oStart.timestamp())
+
+def harvestIncremental(sRoleLabel, sResumeUrl=None, nSkip=0):
+    global sPendingCursor
+    sCursor = loadIncrementalCursor()
+    sApi = f"{sZendeskBaseUrl}/api/v2/incremental/tickets/cursor.json?per_page=1000"
+    if sResumeUrl:
+        sPage = sResumeUrl
+    elif sCursor:
+        sPage = f"{sApi}&cursor={urllib.parse.quote(sCursor, safe='')}"
+    else:
+        print("No saved incremental cursor, exporting every ticket once to seed it.")
+        sPage = f"{sApi}&start_time={incrementalStartTime()}"
+    while sPage and not oStopEvent.is_set():
+        dMeta = {}
+        for nItem, dT in enumerate(iterPageItems(sPage, "tickets", dMeta), 1):
+            if nItem > nSkip:
+                ingestTicket(dT, sRoleLabel, "harvestIncremental", (sPage, nItem))
+        nSkip = 0
+        sCursor = dMeta.get("after_cursor") or sCursor
+        if dMeta.get("end_of_stream"):
+            break
+        sPage = dMeta.get("after_url")
+    # Saved only once every ticket up to this cursor has been flushed
+    sPendingCursor = sCursor if not oStopEvent.is_set() else None
+    markRoleDone(sRoleLabel, "harvestIncremental")
     return
 
-def harvestSearch(sRoleLabel, sQuery):
-    global aTicketList, nBatchIndex, nTotalWritten
-    sEncoded = urllib.parse.quote(sQuery, safe=":+")
-    sPage = f"{sZendeskBaseUrl}/api/v2/search.json?query={sEncoded}&per_page=100"
-    while sPage:
-        dJ = httpGetJson(sPage)
-        for dHit in dJ.get("results", []):
-            if dHit.get("result_type") == "ticket":
-                dHit["_role"] = sRoleLabel
-                aTicketList.append(dHit)
-                if len(aTicketList) >= 50:
-                    nTotalWritten += flushBatch()
+# ---------------- Asyncio engine ----------------
+# Same retry / 429 / 5xx handling as httpGetJson, but the roles' pages in flight from one thread.
+# Each role follows its own next links, so at most one request per role is in flight and
+# ZENMASTER_ASYNC_INFLIGHT only matters below the number of roles. Ingesting a page (batch flush,
+# filters, name lookups, writing, the store) blocks, so it runs in a worker thread off the loop.
+async def asyncHttpGetJson(oSession, oSem, sUrl, nMaxRetries=6):
+    import aiohttp
+    dCached = cacheLoad(sUrl) if bHttpCache else None
+    if dCached and dCached["fresh"]:
+        return dCached["body"]
+    dCondHeaders = cacheConditionalHeaders(dCached)
+    nTry = 0
+    while True:
+        nTry += 1
+        fWait = rateReserve()
+        if fWait > 0:
+            await asyncio.sleep(fWait)
+        async with oSem:
+            try:
+                async with oSession.get(sUrl, headers=dCondHeaders) as oResp:
+                    nStatus = oResp.status
+                    dHeaders = oResp.headers
+                    sBody = await oResp.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if nTry >= nMaxRetries:
+                    print(f"Network error contacting Zendesk: {e}")
+                    sys.exit(1)
+                await asyncio.sleep(min(2 ** (nTry - 1), 30))
+                continue
+        rateObserve(dHeaders)
+
+        if nStatus == 304 and dCached:
+            cacheTouch(sUrl)
+            return dCached["body"]
+
+        if nStatus == 429:
+            try:
+                nSleep = max(1, int(float(dHeaders.get("Retry-After", "2"))))
+            except Exception:
+                nSleep = 2
+            ratePause(nSleep)
+            if nTry >= nMaxRetries:
+                print("Rate limited by Zendesk too many times (429).")
+                sys.exit(1)
+            continue
+
+        if 500 <= nStatus < 600:
+            if nTry >= nMaxRetries:
+                print(f"Zendesk server error {nStatus}.")
+                sys.exit(1)
+            await asyncio.sleep(min(2 ** (nTry - 1), 30))
+            continue
+
+        if nStatus in (401, 403):
+            print(f"Authentication/authorization failed ({nStatus}). Check ZENDESK_SUBDOMAIN / ZENDESK_EMAIL / ZENDESK_API_TOKEN.")
+            if sBody:
+                print(sBody)
+            sys.exit(1)
+
+        if nStatus >= 400:
+            print(f"HTTP error from Zendesk: {nStatus} for url: {sUrl}")
+            if sBody:
+                print(sBody)
+            sys.exit(1)
+
+        try:
+            dBody = json.loads(sBody)
+        except ValueError:
+            print("Invalid JSON received from Zendesk.")
+            sys.exit(1)
+        if bHttpCache:
+            cacheStore(sUrl, dHeaders, dBody)
+        if oArgs.record:
+            recordPage(sUrl, sBody.encode("utf-8"))
+        return dBody
+
+async def aiterPages(oSession, oSem, sPage):
+    while sPage and not oStopEvent.is_set():
+        dJ = await asyncHttpGetJson(oSession, oSem, sPage)
+        yield sPage, dJ
         sPage = sNextLink(dJ)
-    return
+
+def ingestTicketsPage(sRoleLabel, sPage, dJ, nSkip):
+    for nItem, dT in enumerate(dJ.get("tickets", []), 1):
+        if nItem > nSkip:
+            ingestTicket(dT, sRoleLabel, "harvestTickets", (sPage, nItem))
+
+def ingestSearchPage(sRoleLabel, sPage, dJ, nSkip):
+    for nItem, dHit in enumerate(dJ.get("results", []), 1):
+        if nItem > nSkip:
+            ingestSearchHit(sRoleLabel, dHit, (sPage, nItem))
+
+async def asyncHarvestTickets(oSession, oSem, sRoleLabel, sStartUrl, sResumeUrl=None, nSkip=0):
+    async for sPage, dJ in aiterPages(oSession, oSem, sResumeUrl or sStartUrl):
+        await asyncio.to_thread(ingestTicketsPage, sRoleLabel, sPage, dJ, nSkip)
+        nSkip = 0
+    await asyncio.to_thread(markRoleDone, sRoleLabel, "harvestTickets")
+
+async def asyncHarvestSearch(oSession, oSem, sRoleLabel, sQuery, sResumeUrl=None, nSkip=0):
+    bWarned = False
+    async for sPage, dJ in aiterPages(oSession, oSem, sResumeUrl or searchStartUrl(sQuery)):
+        await asyncio.to_thread(ingestSearchPage, sRoleLabel, sPage, dJ, nSkip)
+        nSkip = 0
+        bWarned = warnSearchCap(sRoleLabel, dJ, bWarned)
+    await asyncio.to_thread(markRoleDone, sRoleLabel, "harvestSearch")
+
+async def asyncRunHarvests(aJobs):
+    import aiohttp
+    dAsyncJobs = {harvestTickets: asyncHarvestTickets, harvestSearch: asyncHarvestSearch}
+    oSem = asyncio.Semaphore(nAsyncInFlight)
+    async with aiohttp.ClientSession(
+        auth=aiohttp.BasicAuth(*tBasicAuth),
+        headers=dDefaultHeaders,
+        timeout=aiohttp.ClientTimeout(total=nDefaultTimeout),
+        connector=aiohttp.TCPConnector(limit=nAsyncInFlight),
+    ) as oSession:
+        aTasks = []
+        for fHarvest, tArgs, dKw in aJobs:
+            if fHarvest in dAsyncJobs:
+                aTasks.append(dAsyncJobs[fHarvest](oSession, oSem, *tArgs, **dKw))
+            else:
+                # The incremental export allows 10 pages a minute, so it simply keeps its blocking loop
+                aTasks.append(asyncio.to_thread(fHarvest, *tArgs, **dKw))
+        try:
+            await asyncio.gather(*aTasks)
+        except BaseException:
+            oStopEvent.set()
+            raise
+
+def runHarvests(aJobs):
+    if bAsyncEngine and not oArgs.replay: # replayed pages are local, there is nothing to overlap
+        try:
+            import aiohttp
+        except ImportError:
+            print("aiohttp not installed, using the blocking engine.")
+        else:
+            asyncio.run(asyncRunHarvests(aJobs))
+            return
+    if nHarvestWorkers <= 1 or len(aJobs) <= 1:
+        for fHarvest, tArgs, dKw in aJobs:
+            fHarvest(*tArgs, **dKw)
+        return
+    oPool = ThreadPoolExecutor(max_workers=min(nHarvestWorkers, len(aJobs)), thread_name_prefix="harvest")
+    aFutures = [oPool.submit(fHarvest, *tArgs, **dKw) for fHarvest, tArgs, dKw in aJobs]
+    try:
+        # Wake on the first failing role rather than behind the long "assigned" walk
+        wait(aFutures, return_when=FIRST_EXCEPTION)
+        for oFut in aFutures:
+            if oFut.done() and not oFut.cancelled() and oFut.exception() is not None:
+                raise oFut.exception() # re-raises SystemExit from httpGetJson in the main thread
+    except BaseException:
+        oStopEvent.set() # let the other roles stop at their next page
+        oPool.shutdown(wait=False, cancel_futures=True)
+        raise
+    oPool.shutdown()
 
 def mainMenu():
     while True:
@@ -728,16 +2295,93 @@ mainMenu()
 aTicketList = []
 nBatchIndex = 1
 nTotalWritten = 0
+oBatchLock = threading.Lock()
+oStopEvent = threading.Event()
 
 bMakeWorkbook = input("Save formatted Excel workbook? (y/n): ").strip().lower() == "y"
 
-harvestTickets("assigned",  f"{sZendeskBaseUrl}/api/v2/tickets.json?page[size]=100")
-harvestSearch("cc",        f"type:ticket+cc:{nMyId}")
-harvestSearch("follower",  f"type:ticket+follower:{nMyId}")
-harvestSearch("requester", f"type:ticket+requester:{nMyId}")
+if bResolveNames:
+    loadNameCache()
+    if oArgs.replay:
+        loadNameCache(os.path.join(oArgs.replay, "names.json"))
+
+if oArgs.record or oArgs.replay or oArgs.from_store:
+    # Recorded pages must not depend on the filters, and a store run sends no search at all,
+    # so every filter runs locally
+    sPushdownQuery, aResidualAtoms = "", list(aAtoms)
+else:
+    sPushdownQuery, aResidualAtoms = planPushdown()
+compileFilters()
+if sPushdownQuery:
+    print("Server-side search terms: " + sPushdownQuery.replace("+", " "))
+
+if bIncremental:
+    tAssignedJob = (harvestIncremental, ("assigned",), {})
+elif sPushdownQuery and bSearchExport:
+    tAssignedJob = (harvestSearch, ("assigned", "type:ticket"), {})
+else:
+    if sPushdownQuery:
+        print("The assigned harvest still walks tickets.json; set ZENMASTER_SEARCH_EXPORT=1 to narrow it on the server too.")
+    tAssignedJob = (harvestTickets, ("assigned", f"{sZendeskBaseUrl}/api/v2/tickets.json?page[size]=100"), {})
+
+aJobs = [
+    tAssignedJob,
+    (harvestSearch,  ("cc",        f"type:ticket+cc:{nMyId}"),        {}),
+    (harvestSearch,  ("follower",  f"type:ticket+follower:{nMyId}"),  {}),
+    (harvestSearch,  ("requester", f"type:ticket+requester:{nMyId}"), {}),
+]
+
+if oArgs.from_store:
+    print(f"Serving this run from {sStorePath}; nothing is fetched from Zendesk.")
+else:
+    dCheckpoint = loadCheckpoint() if oArgs.resume else None
+    if dCheckpoint:
+        if dCheckpoint.get("proposition") != formatProposition():
+            print(f"Note: the interrupted run was filtered by {dCheckpoint.get('proposition')}, this one by {formatProposition()}.")
+        nBatchIndex = dCheckpoint.get("batch_index", 1)
+        nTotalWritten = dCheckpoint.get("total_written", 0)
+        aJobs = resumeJobs(aJobs, dCheckpoint)
+        if bDedup:
+            loadSeenLog()
+    else:
+        if os.path.exists(sCheckpointPath):
+            print("A checkpoint from an interrupted run exists; it will be replaced. Run with --resume to continue it instead.")
+        if os.path.exists(sSeenLogPath):
+            os.remove(sSeenLogPath)
+
+if bPipeline:
+    startPipeline()
+
+try:
+    if oArgs.from_store:
+        serveFromStore()
+    else:
+        runHarvests(aJobs)
+except BaseException:
+    # What was already fetched still gets written and checkpointed before exiting
+    oStopEvent.set()
+    finishBatches()
+    raise
+finishBatches()
+
+if setLateRoles:
+    writeLateRoles()
+
+if not oStopEvent.is_set() and not oArgs.from_store:
+    # The run completed, nothing left to resume
+    for sPath in (sCheckpointPath, sSeenLogPath):
+        if os.path.exists(sPath):
+            os.remove(sPath)
+
+if bResolveNames and not oArgs.from_store:
+    saveNameCache()
+    if oArgs.record:
+        saveNameCache(os.path.join(oArgs.record, "names.json"))
 
-nTotalWritten += flushBatch()
-while aTicketList:
-    nTotalWritten += flushBatch()
+if sPendingCursor and not oArgs.replay:
+    saveIncrementalCursor(sPendingCursor)
+    print(f"Saved incremental cursor -> {sCursorPath}")
 
 print(f"Total tickets written across batches: {nTotalWritten}")
+if dRate["nThrottles"]:
+    print(f"Rate limiter paused requests {dRate['nThrottles']} time(s), {dRate['fThrottled']:.1f}s in total.")